@@ -0,0 +1,59 @@
+from sqlalchemy import exists, or_, select, union
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Visibility rules in one place: a user can see documents they wrote, documents shared
+# with them, and public documents. Every read endpoint filters through here.
+#
+# accessible_filter() checks one row at a time (author, visibility, then a probe of the
+# (user_id, document_id) share key), so point lookups and search matches never build
+# the full set of accessible ids. Listing uses newest_accessible_ids() instead.
+
+
+def accessible_filter(current_user):
+    return or_(
+        models.Document.author_id == current_user.id,
+        models.Document.visibility == "public",
+        exists().where(
+            models.DocumentShare.document_id == models.Document.id,
+            models.DocumentShare.user_id == current_user.id
+        ),
+    )
+
+
+# Ids of the `limit` newest documents (on created_at, id) the user can see that also
+# match `criteria`, e.g. a keyset filter. Each rule reads its own index in order -
+# (author_id, created_at), (visibility, created_at), the user's shares - and stops after
+# `limit` rows, so a page costs at most 3 * limit rows however much the user can see.
+def newest_accessible_ids(user_id: int, limit: int, *criteria):
+    doc = models.Document
+    newest = (doc.created_at.desc(), doc.id.desc())
+    branches = [
+        select(doc.id, doc.created_at).where(doc.author_id == user_id),
+        select(doc.id, doc.created_at).where(doc.visibility == "public"),
+        select(doc.id, doc.created_at).join(
+            models.DocumentShare, models.DocumentShare.document_id == doc.id
+        ).where(models.DocumentShare.user_id == user_id),
+    ]
+    merged = union(*(
+        select(branch.where(*criteria).order_by(*newest).limit(limit).subquery())
+        for branch in branches
+    )).subquery()
+    return select(merged.c.id).order_by(merged.c.created_at.desc(), merged.c.id.desc()).limit(limit)
+
+
+# Fetch one document if the user can see it (one query), else None
+def get_accessible_document(db: Session, doc_id: int, current_user):
+    return db.query(models.Document).filter(
+        models.Document.id == doc_id,
+        accessible_filter(current_user)
+    ).first()
+
+
+# Same check without loading the document
+def can_view(db: Session, doc_id: int, current_user) -> bool:
+    return db.query(models.Document.id).filter(
+        models.Document.id == doc_id,
+        accessible_filter(current_user)
+    ).first() is not None
@@ -1,9 +1,17 @@
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import os
+import threading
 
 # Hashing - To protect the passwords from leakin.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising BCRYPT_ROUNDS makes older hashes "need update"; they get rehashed on next login.
+BCRYPT_ROUNDS = 12
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def hash_password(password: str):
     return pwd_context.hash(password)
@@ -11,6 +19,73 @@ def hash_password(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+# Returns (valid, new_hash); new_hash is None unless the stored hash is outdated
+def verify_and_update_password(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+# Password pool - bcrypt is CPU-bound, so it runs in its own processes instead of the
+# request threadpool. A login burst then uses at most PASSWORD_WORKERS cores and can't
+# queue unrelated requests behind it; past PASSWORD_MAX_PENDING jobs we fail fast.
+PASSWORD_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+PASSWORD_MAX_PENDING = PASSWORD_WORKERS * 8
+
+class PasswordPoolBusy(Exception):
+    pass
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is not safe
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+async def _run_in_pool(fn, *args):
+    global _pending
+    with _pool_lock:
+        if _pending >= PASSWORD_MAX_PENDING:
+            raise PasswordPoolBusy()
+        _pending += 1
+    pool = _get_pool()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # A worker died (OOM kill, crash); the executor won't recover, so the next
+        # call starts a new one and this request is shed like an overload
+        _discard_pool(pool)
+        raise PasswordPoolBusy()
+    finally:
+        with _pool_lock:
+            _pending -= 1
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+async def hash_password_async(password: str):
+    return await _run_in_pool(hash_password, password)
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await _run_in_pool(verify_and_update_password, plain_password, hashed_password)
+
+def shutdown_password_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
 # JWT
 SECRET_KEY = "supersecret"
 ALGORITHM = "HS256"
@@ -0,0 +1,240 @@
+import argparse
+import json
+import sys
+import zlib
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import Session
+
+from app import models, search
+from app.database import SessionLocal, engine
+
+# Bulk export/import as NDJSON: one document per line, with its shares inline.
+#
+#   {"title": ..., "content": ..., "visibility": ..., "author_id": ..., "created_at": ...,
+#    "updated_at": ..., "shares": [{"user_id": ..., "can_edit": ...}], "id": ...}
+#
+# Export streams rows through a server-side cursor (yield_per), so memory stays flat
+# however many documents there are. Import inserts CHUNK_SIZE documents at a time with
+# batched executes and commits once per chunk. Imported documents get new ids.
+#
+# CLI (no access filtering - all documents, original authors kept):
+#   python -m app.bulk export > backup.ndjson
+#   python -m app.bulk import backup.ndjson
+
+CHUNK_SIZE = 1000
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def export_documents(db: Session, doc_filter=None, chunk_size: int = CHUNK_SIZE):
+    """Yield NDJSON lines for every document matching `doc_filter` (all if None)."""
+    stmt = select(
+        models.Document.id,
+        models.Document.title,
+        models.Document.content,
+        models.Document.visibility,
+        models.Document.author_id,
+        models.Document.created_at,
+        models.Document.updated_at
+    ).order_by(models.Document.id).execution_options(yield_per=chunk_size)
+    if doc_filter is not None:
+        stmt = stmt.where(doc_filter)
+
+    for rows in db.execute(stmt).partitions():
+        # One shares query per chunk
+        shares = {}
+        for share in db.execute(
+            select(
+                models.DocumentShare.document_id,
+                models.DocumentShare.user_id,
+                models.DocumentShare.can_edit
+            ).where(models.DocumentShare.document_id.in_([row.id for row in rows]))
+        ):
+            shares.setdefault(share.document_id, []).append(
+                {"user_id": share.user_id, "can_edit": share.can_edit}
+            )
+
+        for row in rows:
+            yield json.dumps({
+                "id": row.id,
+                "title": row.title,
+                "content": row.content,
+                "visibility": row.visibility,
+                "author_id": row.author_id,
+                "created_at": _iso(row.created_at),
+                "updated_at": _iso(row.updated_at),
+                "shares": shares.get(row.id, []),
+            }) + "\n"
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def parse_line(line_no: int, line):
+    """Parse and check one NDJSON line. Returns None for blank lines."""
+    if isinstance(line, bytes):
+        try:
+            line = line.decode("utf-8")
+        except UnicodeDecodeError:
+            raise InvalidRecord(f"Line {line_no}: not valid UTF-8")
+    if not line.strip():
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise InvalidRecord(f"Line {line_no}: not valid JSON")
+    if not isinstance(record, dict) or not isinstance(record.get("title"), str):
+        raise InvalidRecord(f"Line {line_no}: a document needs a string title")
+    if not isinstance(record.get("content") or "", str):
+        raise InvalidRecord(f"Line {line_no}: content must be a string")
+    if record.get("visibility") not in (None, "public", "private"):
+        raise InvalidRecord(f"Line {line_no}: visibility must be public or private")
+
+    try:
+        created_at = record.get("created_at")
+        record["created_at"] = datetime.fromisoformat(created_at) if created_at else None
+    except (TypeError, ValueError):
+        raise InvalidRecord(f"Line {line_no}: created_at is not an ISO timestamp")
+
+    shares = record.get("shares") or []
+    if not isinstance(shares, list) or not all(
+        isinstance(share, dict) and isinstance(share.get("user_id"), int) for share in shares
+    ):
+        raise InvalidRecord(f"Line {line_no}: shares must be a list of {{user_id, can_edit}}")
+    record["shares"] = shares
+    return record
+
+
+def import_chunk(db: Session, records, author_id: int = None):
+    """Insert one chunk of parsed records and commit. Returns (documents, shares) inserted.
+
+    With `author_id` every document is owned by that user; otherwise each record's
+    author_id is kept.
+    """
+    if not records:
+        return 0, 0
+
+    now = datetime.now(timezone.utc)
+    doc_rows = []
+    for record in records:
+        doc_rows.append({
+            "title": record["title"],
+            "content": record.get("content") or "",
+            "visibility": record.get("visibility") or "private",
+            "author_id": author_id if author_id is not None else record.get("author_id"),
+            "created_at": record["created_at"] or now,
+            "revision": 1,
+        })
+
+    # One batched INSERT ... RETURNING for the whole chunk, ids in input order
+    ids = db.execute(
+        insert(models.Document).returning(models.Document.id, sort_by_parameter_order=True),
+        doc_rows
+    ).scalars().all()
+
+    # Keep only shares with users that exist here (one query), never with the author
+    wanted = {
+        share["user_id"] for record in records for share in record["shares"]
+    }
+    known = set()
+    if wanted:
+        known = set(db.execute(
+            select(models.User.id).where(models.User.id.in_(wanted))
+        ).scalars())
+
+    share_rows = []
+    for doc_id, row, record in zip(ids, doc_rows, records):
+        seen = set()
+        for share in record["shares"]:
+            user_id = share["user_id"]
+            if user_id in known and user_id != row["author_id"] and user_id not in seen:
+                seen.add(user_id)
+                share_rows.append({
+                    "document_id": doc_id,
+                    "user_id": user_id,
+                    "can_edit": bool(share.get("can_edit")),
+                })
+    if share_rows:
+        db.execute(insert(models.DocumentShare), share_rows)
+
+    # Revision 1 of each imported document is a full snapshot
+    db.execute(insert(models.DocumentRevision), [
+        {
+            "document_id": doc_id,
+            "number": 1,
+            "kind": "snapshot",
+            "title": row["title"],
+            "author_id": row["author_id"],
+            "size": len(row["content"]),
+            "data": zlib.compress(row["content"].encode("utf-8")),
+        }
+        for doc_id, row in zip(ids, doc_rows)
+    ])
+
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(
+            text(f"INSERT INTO {search.FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+            [
+                {"id": doc_id, "title": row["title"], "content": search.strip_tags(row["content"])}
+                for doc_id, row in zip(ids, doc_rows)
+            ]
+        )
+
+    db.commit()
+    return len(ids), len(share_rows)
+
+
+def import_lines(db: Session, lines, author_id: int = None, chunk_size: int = CHUNK_SIZE):
+    """Import NDJSON lines chunk by chunk. Returns (documents, shares) inserted."""
+    documents = shares = 0
+    chunk = []
+    for line_no, line in enumerate(lines, start=1):
+        record = parse_line(line_no, line)
+        if record is None:
+            continue
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            added = import_chunk(db, chunk, author_id)
+            documents += added[0]
+            shares += added[1]
+            chunk = []
+
+    added = import_chunk(db, chunk, author_id)
+    return documents + added[0], shares + added[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bulk", description="Bulk export/import documents as NDJSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("export", help="write all documents to stdout")
+    importer = commands.add_parser("import", help="read documents from a file (or - for stdin)")
+    importer.add_argument("path")
+    importer.add_argument("--author-id", type=int, help="own every imported document by this user")
+    importer.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(bind=engine)
+    search.init_search(engine)
+
+    db = SessionLocal()
+    try:
+        if args.command == "export":
+            for line in export_documents(db):
+                sys.stdout.write(line)
+            return
+
+        source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        with source:
+            documents, shares = import_lines(db, source, args.author_id, args.chunk_size)
+        print(f"Imported {documents} documents and {shares} shares", file=sys.stderr)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app.cache import MemoryBackend
+from app.metrics import Callback
+
+# HTTP caching for single-document reads.
+#
+# Validators come from columns every save already maintains (revision, updated_at), so
+# a conditional request is answered from a metadata-only query - or, for public
+# documents, from the in-process cache - without loading content.
+#
+# Public documents are additionally cached in-process. Routes call
+# invalidate_document() after committing an edit or delete; the TTL bounds how long
+# other workers (which don't see that call) can serve an old version.
+#
+# A request that loaded a document just before an edit committed must not put that
+# old copy back after the invalidation. Each invalidation bumps a generation counter
+# (one per stripe of document ids, so memory stays bounded); cache_public_document()
+# only stores if the generation is still the one read before loading.
+
+PUBLIC_CACHE_TTL_SECONDS = 30
+PUBLIC_CACHE_MAX_SIZE = 1000
+
+GENERATION_STRIPES = 1024
+
+public_cache = MemoryBackend(PUBLIC_CACHE_MAX_SIZE, PUBLIC_CACHE_TTL_SECONDS)
+_generations = [0] * GENERATION_STRIPES
+_generations_lock = threading.Lock()
+
+Callback("public_document_cache_size", "Public documents cached in this process.", "gauge", lambda: len(public_cache))
+
+
+class CachedDocument:
+    def __init__(self, doc, etag: str, last_modified: datetime):
+        self.doc = doc  # detached, fully loaded Document
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def validators(doc_id: int, revision: int, updated_at: datetime, created_at: datetime):
+    """Return (etag, last_modified) for a document version."""
+    modified = _utc(updated_at or created_at or datetime.fromtimestamp(0, timezone.utc))
+    # Weak: the representation may be gzipped on the way out
+    etag = f'W/"{doc_id}-{revision}-{int(modified.timestamp() * 1_000_000)}"'
+    return etag, modified
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since; compare weakly
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_cache_headers(response: Response, etag: str, last_modified: datetime, public: bool):
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    # Always revalidate: edits must show up immediately, and a 304 costs next to nothing
+    response.headers["Cache-Control"] = "public, no-cache" if public else "private, no-cache"
+
+
+def not_modified_response(etag: str, last_modified: datetime, public: bool) -> Response:
+    response = Response(status_code=304)
+    set_cache_headers(response, etag, last_modified, public)
+    return response
+
+
+# Read before loading a document that may be cached
+def generation(doc_id: int) -> int:
+    return _generations[doc_id % GENERATION_STRIPES]
+
+
+def cache_public_document(doc_id: int, cached: CachedDocument, loaded_generation: int) -> bool:
+    with _generations_lock:
+        if _generations[doc_id % GENERATION_STRIPES] != loaded_generation:
+            return False  # invalidated while loading; this copy may be stale
+        public_cache.set(doc_id, cached)
+        return True
+
+
+def invalidate_document(doc_id: int):
+    with _generations_lock:
+        _generations[doc_id % GENERATION_STRIPES] += 1
+        public_cache.delete(doc_id)
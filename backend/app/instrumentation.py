@@ -0,0 +1,190 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+from starlette.routing import Match
+
+from app.metrics import Callback, Counter, Gauge, Histogram
+
+# Request and SQL instrumentation, exported by GET /metrics.
+#
+# MetricsMiddleware times each request and labels it with its route template
+# ("/documents/{doc_id}", not the raw path). It puts a RequestStats in a context
+# variable; the cursor-execute hooks add each statement's count and time to it, which
+# works for sync routes too because the threadpool runs them in a copy of the request's
+# context. Statements run outside a request (startup, the bulk CLI) only feed the
+# global statement histogram.
+#
+# Cost per request is one route match plus a handful of locked dict updates, and one
+# perf_counter pair per statement. METRICS_ENABLED=0 turns all of it off.
+#
+# SLOW_QUERY_MS sets the slow-query log threshold (default 500; 0 disables it). Slow
+# statements are logged on the "app.sql" logger with their route, never with their
+# parameters.
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_MAX_LENGTH = 1000  # characters of SQL to log
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+slow_query_log = logging.getLogger("app.sql")
+
+REQUEST_LABELS = ("method", "route")
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status.", REQUEST_LABELS + ("status",)
+)
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to fully send the response.", REQUEST_LABELS
+)
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", REQUEST_LABELS
+)
+request_statements = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request.", REQUEST_LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+)
+request_sql_duration = Histogram(
+    "http_request_sql_duration_seconds", "Time spent executing SQL per request.", REQUEST_LABELS
+)
+statement_duration = Histogram(
+    "db_statement_duration_seconds", "Execution time of individual SQL statements."
+)
+slow_statements = Counter(
+    "db_slow_statements_total", "SQL statements slower than SLOW_QUERY_MS.", ("route",)
+)
+pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+pool_checkout_timeouts = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a connection."
+)
+
+
+class RequestStats:
+    __slots__ = ("route", "statements", "sql_seconds")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+
+def configure_slow_query_log(threshold_ms: float):
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = threshold_ms
+
+
+def _route_template(routes, scope) -> str:
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # right path, wrong method: a 405 for that route
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Pure ASGI (not BaseHTTPMiddleware) so streamed bodies and contextvars pass straight through."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        labels = (scope["method"], _route_template(self.routes, scope))
+        stats = RequestStats(labels[1])
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_request.set(stats)
+        requests_in_flight.inc(labels)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            requests_in_flight.dec(labels)
+            requests_total.inc(labels + (str(status),))
+            request_duration.observe(elapsed, labels)
+            request_statements.observe(stats.statements, labels)
+            request_sql_duration.observe(stats.sql_seconds, labels)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    statement_duration.observe(elapsed)
+
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+
+    if SLOW_QUERY_MS > 0 and elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else ""
+        slow_statements.inc((route,))
+        slow_query_log.warning(
+            "Slow query (%.1f ms%s%s): %s",
+            elapsed * 1000,
+            ", executemany" if executemany else "",
+            f", {route}" if route else "",
+            " ".join(statement.split())[:SLOW_QUERY_MAX_LENGTH]
+        )
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def connect(self):
+        if not ENABLED:
+            return super().connect()
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeout:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    # Read from engine.pool at scrape time: dispose() replaces the pool object
+    def pool_stat(name):
+        return lambda: getattr(engine.pool, name)() if isinstance(engine.pool, QueuePool) else None
+
+    Callback("db_pool_connections_in_use", "Connections currently checked out.", "gauge", pool_stat("checkedout"))
+    Callback("db_pool_connections_idle", "Connections idle in the pool.", "gauge", pool_stat("checkedin"))
+    Callback("db_pool_size", "Configured pool size.", "gauge", pool_stat("size"))
+    Callback("db_pool_overflow", "Connections open beyond the pool size (negative: not yet opened).", "gauge", pool_stat("overflow"))
@@ -1,13 +1,35 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app import models
+from app import models, auth, instrumentation, tasks
 from app.database import engine
 from app.routes import router as auth_routes
+from app.search import init_search
+from app.user_cache import RedisBackend, configure_backend
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 
 models.Base.metadata.create_all(bind=engine)
+init_search(engine)
 
-app = FastAPI()
+# Per-request SQL counts/timings and the slow-query log (exported by GET /metrics)
+if instrumentation.ENABLED:
+    instrumentation.instrument_engine(engine)
+
+# Share the authenticated-user cache across workers when Redis is available
+if os.getenv("USER_CACHE_REDIS_URL"):
+    configure_backend(RedisBackend(os.environ["USER_CACHE_REDIS_URL"]))
+
+@asynccontextmanager
+async def lifespan(app):
+    # Also picks up background jobs left queued by a previous run
+    tasks.task_queue.start()
+    yield
+    tasks.task_queue.stop()
+    auth.shutdown_password_pool()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(auth_routes)
 
 
@@ -19,3 +41,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# Compress larger responses (document bodies, long lists) when the client accepts gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Outermost, so request timings include CORS and compression
+if instrumentation.ENABLED:
+    app.add_middleware(instrumentation.MetricsMiddleware, routes=auth_routes.routes)
@@ -0,0 +1,88 @@
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app import http_cache, models, tasks
+
+# @mentions auto-share a document (view access) with the mentioned users.
+#
+# Saving a document only queues the newly added usernames; sharing happens after the
+# commit in a background batch (app/tasks.py). A batch covers every save in the
+# batching window and resolves them all with one query for the documents, one for the
+# users, one for the shares they already have and one executemany for the new shares.
+
+MENTION_RE = re.compile(r"@(\w+)")
+
+
+def extract_mentions(content: str):
+    return set(MENTION_RE.findall(content or ""))
+
+
+def share_with_mentions(db: Session, doc: models.Document, old_content: str = None):
+    """Queue sharing `doc` with users newly mentioned in its content.
+
+    On updates pass the previous content as `old_content`: only mentions that were
+    not already there are queued. Removing a mention does not revoke access.
+    `doc` must have an id (flush first).
+    """
+    added = extract_mentions(doc.content) - extract_mentions(old_content)
+    if added:
+        tasks.enqueue(db, "share_mentions", {"document_id": doc.id, "usernames": sorted(added)})
+
+
+@tasks.handler("share_mentions")
+def share_mentions(db: Session, payloads):
+    mentioned = {}
+    for payload in payloads:
+        mentioned.setdefault(payload["document_id"], set()).update(payload["usernames"])
+
+    # Documents deleted since they were saved drop out here
+    authors = dict(
+        db.query(models.Document.id, models.Document.author_id).filter(models.Document.id.in_(mentioned))
+    )
+    usernames = set().union(*(mentioned[doc_id] for doc_id in authors))
+    if not usernames:
+        return
+
+    user_ids = dict(
+        db.query(models.User.username, models.User.id).filter(models.User.username.in_(usernames))
+    )
+    if not user_ids:
+        return
+
+    existing = {
+        (doc_id, user_id) for doc_id, user_id in db.query(
+            models.DocumentShare.document_id, models.DocumentShare.user_id
+        ).filter(
+            models.DocumentShare.document_id.in_(authors),
+            models.DocumentShare.user_id.in_(user_ids.values())
+        )
+    }
+
+    rows = []
+    for doc_id, author_id in authors.items():
+        for username in sorted(mentioned[doc_id]):
+            user_id = user_ids.get(username)
+            if user_id is None or user_id == author_id or (doc_id, user_id) in existing:
+                continue
+            existing.add((doc_id, user_id))
+            rows.append({"document_id": doc_id, "user_id": user_id, "can_edit": False})
+    if not rows:
+        return
+
+    db.execute(insert(models.DocumentShare), rows)
+
+    # Shares are part of the document response: move its validators (ETag,
+    # Last-Modified) on and drop cached copies, without touching the revision.
+    # Timestamp from Python: SQLite's CURRENT_TIMESTAMP only has whole seconds.
+    shared = sorted({row["document_id"] for row in rows})
+    db.execute(
+        update(models.Document).where(models.Document.id.in_(shared)).values(
+            updated_at=datetime.now(timezone.utc)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    for doc_id in shared:
+        tasks.on_commit(db, http_cache.invalidate_document, doc_id)
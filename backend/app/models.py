@@ -1,8 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import (
+    Column, Integer, String, Text, ForeignKey, DateTime, Boolean, LargeBinary, Index, UniqueConstraint,
+    JSON, literal_column
+)
+from sqlalchemy.orm import relationship, query_expression
 from sqlalchemy.sql import func
 from app.database import Base
 
+# Full-text search vector over title + content (Postgres). Queries must use this exact
+# expression so the planner can match it against the GIN index on documents.
+def search_vector(title, content):
+    return func.to_tsvector(
+        literal_column("'english'::regconfig"),
+        func.coalesce(title, "") + " " + func.coalesce(content, "")
+    )
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,6 +39,33 @@ class Document(Base):
     shares = relationship("DocumentShare", back_populates="document", cascade="all, delete-orphan")
     # models.py (Document class)
     visibility = Column(String, default="private")  # can be "public" or "private"
+    # Bumped on every save; matches DocumentRevision.number of the current content
+    revision = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Filled per-query with with_expression() so list views can skip loading content
+    excerpt = query_expression()
+    # Filled by search queries
+    rank = query_expression()
+    snippet = query_expression()
+
+    # Optimistic concurrency: every UPDATE of a document carries "WHERE revision = <loaded
+    # value>", so a save based on a stale copy fails instead of overwriting. Routes bump
+    # revision themselves when the content changes (version_id_generator=False).
+    __mapper_args__ = {"version_id_col": revision, "version_id_generator": False}
+
+    __table_args__ = (
+        # Access resolution (app/access.py) and newest-first listing
+        Index("ix_documents_author_created", author_id, created_at),
+        Index("ix_documents_visibility_created", visibility, created_at),
+        Index(
+            "ix_documents_search",
+            search_vector(title, content),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+def document_search_vector():
+    return search_vector(Document.title, Document.content)
 
 class DocumentShare(Base):
     __tablename__ = "document_shares"
@@ -39,3 +77,48 @@ class DocumentShare(Base):
 
     document = relationship("Document", back_populates="shares")
     user = relationship("User", back_populates="shared_documents")
+
+    __table_args__ = (
+        # One share per (user, document); also serves "documents shared with me" lookups
+        UniqueConstraint("user_id", "document_id", name="uq_document_shares_user_document"),
+        Index("ix_document_shares_document_id", "document_id"),
+    )
+
+# History of a document's content (see app/revisions.py). No relationship on Document
+# on purpose: loading a document should never pull in its history.
+class DocumentRevision(Base):
+    __tablename__ = "document_revisions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    number = Column(Integer, nullable=False)
+    kind = Column(String, nullable=False)  # "snapshot" or "delta"
+    title = Column(String, nullable=False)
+    author_id = Column(Integer, ForeignKey("users.id"))
+    size = Column(Integer, nullable=False)  # length of the full content at this revision
+    data = Column(LargeBinary, nullable=False)  # zlib: full text or JSON delta
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("document_id", "number", name="uq_document_revisions_document_number"),
+        # Latest snapshot at or before a revision (saves and rebuilds)
+        Index("ix_document_revisions_document_kind_number", document_id, kind, number),
+    )
+
+# Durable queue of post-commit work (see app/tasks.py). A row lives until its job
+# succeeds; a job that keeps failing stays behind with status "failed".
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="queued", server_default="queued")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_background_jobs_status_run_after", status, run_after),
+    )
@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXCERPT_LENGTH = 200
+# Deepest row offset an offset cursor may reach; the database still ranks every row
+# before it, so paging that deep costs as much as it looks
+MAX_OFFSET = 10_000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _encode(value) -> str:
+    raw = json.dumps(value).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+# Cursor is opaque to clients: base64 of [created_at, id] of the last row on the page
+def encode_cursor(created_at: datetime, doc_id: int) -> str:
+    return _encode([created_at.isoformat(), doc_id])
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, doc_id = _decode(cursor)
+        created_at, doc_id = datetime.fromisoformat(created_at), int(doc_id)
+    except (ValueError, TypeError, OverflowError):
+        raise InvalidCursor(cursor)
+    # Must fit a 64-bit bind parameter
+    if not 0 <= doc_id < 2 ** 63:
+        raise InvalidCursor(cursor)
+    return created_at, doc_id
+
+
+# Ranked results have no stable keyset, so their cursor wraps a row offset instead
+def encode_offset_cursor(offset: int) -> str:
+    return _encode({"offset": offset})
+
+
+def decode_offset_cursor(cursor: str) -> int:
+    try:
+        offset = int(_decode(cursor)["offset"])
+    except (ValueError, TypeError, KeyError, OverflowError):
+        raise InvalidCursor(cursor)
+    if not 0 <= offset <= MAX_OFFSET:
+        raise InvalidCursor(cursor)
+    return offset
+
+
+# Keyset filter for "newest first" ordering on (created_at, id).
+# Compares against the cursor row's stored created_at rather than the value in the
+# cursor: SQLite keeps CURRENT_TIMESTAMP as whole-second text, which never equals the
+# bound datetime. The cursor's own value only stands in if that row was deleted.
+def keyset_filter(created_col, id_col, cursor: str):
+    created_at, doc_id = decode_cursor(cursor)
+    stored = func.coalesce(
+        select(created_col).where(id_col == doc_id).correlate(None).scalar_subquery(),
+        created_at
+    )
+    # The leading <= is redundant but lets an index on (..., created_at) seek to the
+    # cursor instead of scanning past every newer row
+    return and_(
+        created_col <= stored,
+        or_(created_col < stored, id_col < doc_id),
+    )
+
+
+def paginate(query, created_col, id_col, limit: int, cursor: str = None):
+    """Run `query` newest-first, one page at a time. Returns (rows, next_cursor)."""
+    if cursor:
+        query = query.filter(keyset_filter(created_col, id_col, cursor))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
@@ -0,0 +1,28 @@
+# Incremental edits: the editor sends only the ranges it changed instead of the whole
+# document. Positions and lengths are in UTF-16 code units, the same units as
+# JavaScript string indexes, so the client can compute them straight from its text.
+
+
+class InvalidPatch(ValueError):
+    pass
+
+
+def apply_ops(text: str, ops) -> str:
+    """Apply text ops in order; each op's `pos` refers to the text left by the previous op."""
+    buf = bytearray((text or "").encode("utf-16-le"))
+    for op in ops:
+        start = op.pos * 2
+        end = start + op.delete * 2
+        if op.pos < 0 or op.delete < 0 or end > len(buf):
+            raise InvalidPatch(f"Op out of range: pos={op.pos} delete={op.delete}")
+        try:
+            buf[start:end] = op.insert.encode("utf-16-le")
+        except UnicodeEncodeError:
+            # JSON allows a lone surrogate ("\ud800"); it is not text
+            raise InvalidPatch("Insert is not valid text")
+
+    try:
+        # surrogatepass off: an op that splits a surrogate pair is rejected here
+        return buf.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise InvalidPatch("Op splits a character")
@@ -0,0 +1,175 @@
+import json
+import re
+import zlib
+from difflib import SequenceMatcher
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, defer
+
+from app import models
+
+# Revision history. documents.content always holds the current text, so reading a
+# document never touches this table. Each save appends one row to document_revisions:
+# a zlib-compressed full snapshot every SNAPSHOT_INTERVAL revisions, otherwise a
+# compressed delta against the previous revision. Any revision is rebuilt from the
+# nearest snapshot at or before it plus at most SNAPSHOT_INTERVAL - 1 deltas.
+
+SNAPSHOT_INTERVAL = 20
+
+# SequenceMatcher is O(n*m) in the worst case, and it runs inside the save request.
+# The changed middle is diffed per character while len(old) * len(new) stays under
+# MAX_DIFF_CELLS (about 1k characters a side; under 0.2 s even on adversarial text),
+# then per word under the same cap, and beyond that stored as a plain replacement.
+MAX_DIFF_CELLS = 1_000_000
+
+_TOKEN_RE = re.compile(r"\s+|\w+|[^\w\s]")
+
+
+def _compress(value) -> bytes:
+    return zlib.compress(value.encode("utf-8"))
+
+
+def _decompress(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+# Delta format: a list of ops applied left to right over the old text.
+#   n > 0 -> copy the next n characters, n < 0 -> skip n characters, "str" -> insert it
+def make_delta(old: str, new: str):
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+
+    ops = []
+    if prefix:
+        ops.append(prefix)
+    if len(old_mid) * len(new_mid) <= MAX_DIFF_CELLS:
+        ops.extend(_diff(list(old_mid), list(new_mid)))
+    else:
+        old_tokens = _TOKEN_RE.findall(old_mid)
+        new_tokens = _TOKEN_RE.findall(new_mid)
+        if len(old_tokens) * len(new_tokens) <= MAX_DIFF_CELLS:
+            ops.extend(_diff(old_tokens, new_tokens))
+        else:
+            if old_mid:
+                ops.append(-len(old_mid))
+            if new_mid:
+                ops.append(new_mid)
+    if suffix:
+        ops.append(suffix)
+    return ops
+
+
+# Delta ops between two lists of string pieces (characters or words)
+def _diff(old_pieces, new_pieces):
+    ops = []
+    matcher = SequenceMatcher(None, old_pieces, new_pieces, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(sum(len(piece) for piece in old_pieces[i1:i2]))
+            continue
+        if i2 > i1:
+            ops.append(-sum(len(piece) for piece in old_pieces[i1:i2]))
+        if j2 > j1:
+            ops.append("".join(new_pieces[j1:j2]))
+    return ops
+
+
+def apply_delta(old: str, ops) -> str:
+    out = []
+    pos = 0
+    for op in ops:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(old[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+def record_revision(db: Session, doc: models.Document, previous_content: str = None):
+    """Append the revision for `doc` as it is now (doc.revision must already be bumped).
+
+    `previous_content` is the content of revision doc.revision - 1; pass None for a
+    new document. Call before the commit so the revision lands in the same transaction.
+    """
+    # Two index seeks (one statement), however long the history is
+    revisions = models.DocumentRevision
+    newest = select(revisions.number).where(
+        revisions.document_id == doc.id
+    ).order_by(revisions.number.desc()).limit(1)
+    last_number, last_snapshot = db.execute(select(
+        newest.scalar_subquery(),
+        newest.where(revisions.kind == "snapshot").scalar_subquery()
+    )).one()
+
+    content = doc.content or ""
+    # Deltas need an unbroken chain back to a snapshot
+    snapshot = (
+        previous_content is None
+        or last_number != doc.revision - 1
+        or last_snapshot is None
+        or doc.revision - last_snapshot >= SNAPSHOT_INTERVAL
+    )
+    if snapshot:
+        data = _compress(content)
+    else:
+        data = _compress(json.dumps(make_delta(previous_content, content), separators=(",", ":")))
+
+    revision = models.DocumentRevision(
+        document_id=doc.id,
+        number=doc.revision,
+        kind="snapshot" if snapshot else "delta",
+        title=doc.title,
+        author_id=doc.author_id,
+        size=len(content),
+        data=data
+    )
+    db.add(revision)
+    return revision
+
+
+# Listing never loads the stored bodies
+def list_revisions(db: Session, doc_id: int):
+    return db.query(models.DocumentRevision).options(
+        defer(models.DocumentRevision.data)
+    ).filter(
+        models.DocumentRevision.document_id == doc_id
+    ).order_by(models.DocumentRevision.number.desc()).all()
+
+
+def get_revision(db: Session, doc_id: int, number: int):
+    """Rebuild revision `number`. Returns (revision row, content) or None."""
+    base = db.query(func.max(models.DocumentRevision.number)).filter(
+        models.DocumentRevision.document_id == doc_id,
+        models.DocumentRevision.kind == "snapshot",
+        models.DocumentRevision.number <= number
+    ).scalar_subquery()
+
+    chain = db.query(models.DocumentRevision).filter(
+        models.DocumentRevision.document_id == doc_id,
+        models.DocumentRevision.number >= base,
+        models.DocumentRevision.number <= number
+    ).order_by(models.DocumentRevision.number).all()
+    if not chain or chain[-1].number != number:
+        return None
+
+    content = _decompress(chain[0].data)
+    for revision in chain[1:]:
+        content = apply_delta(content, json.loads(_decompress(revision.data)))
+    return chain[-1], content
+
+
+def delete_revisions(db: Session, doc_id: int):
+    db.query(models.DocumentRevision).filter(
+        models.DocumentRevision.document_id == doc_id
+    ).delete(synchronize_session=False)
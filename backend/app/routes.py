@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, defer, selectinload, with_expression
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy import func, true, update
 from app.database import SessionLocal
-from app import models, schemas, auth
+from app import models, schemas, auth, search, revisions, http_cache, bulk, instrumentation, metrics
+from app.access import accessible_filter, can_view, get_accessible_document, newest_accessible_ids
+from app.user_cache import CachedUser, user_cache
+from app.mentions import share_with_mentions
+from app.patches import InvalidPatch, apply_ops
 from jose import JWTError, jwt
 from app.auth import SECRET_KEY, ALGORITHM
-from typing import List
-import re  # for @mention parsing
+from app.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, MAX_OFFSET, EXCERPT_LENGTH, InvalidCursor, keyset_filter, paginate,
+    encode_offset_cursor, decode_offset_cursor
+)
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -18,38 +28,78 @@ def get_db():
     finally:
         db.close()
 
-# Register
+def get_user_by_email(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(hashed_password=hashed_password)
+    )
+    db.commit()
+
+# Password hashing runs in the auth process pool; when its queue is full we shed load
+def password_pool_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many sign-in requests, please retry",
+        headers={"Retry-After": "1"}
+    )
+
+# Register (async so the request thread isn't held while bcrypt runs; DB calls go
+# through the threadpool). The lookup's transaction ends before hashing so a burst of
+# sign-ins never holds pooled connections while it waits for the password pool.
 @router.post("/register", response_model=schemas.Token)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(get_user_by_email, db, user.email)
+    await run_in_threadpool(db.rollback)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = auth.hash_password(user.password)
+    try:
+        hashed_pw = await auth.hash_password_async(user.password)
+    except auth.PasswordPoolBusy:
+        raise password_pool_busy()
+
     new_user = models.User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_pw
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await run_in_threadpool(db.commit)
 
-    token = auth.create_access_token({"sub": new_user.email})
+    token = auth.create_access_token({"sub": user.email})
     return {"access_token": token, "token_type": "bearer"}
 
-# Login
+# Login (rehashes the password if it was stored with outdated cost settings). As in
+# register, no connection is held while bcrypt runs.
 @router.post("/login", response_model=schemas.Token)
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not auth.verify_password(user.password, db_user.hashed_password):
+async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(get_user_by_email, db, user.email)
+    if not db_user:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    user_id, hashed_pw = db_user.id, db_user.hashed_password
+    await run_in_threadpool(db.rollback)
+
+    try:
+        valid, new_hash = await auth.verify_and_update_password_async(user.password, hashed_pw)
+    except auth.PasswordPoolBusy:
+        raise password_pool_busy()
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
-    
-    token = auth.create_access_token({"sub": db_user.email})
+
+    if new_hash:
+        await run_in_threadpool(update_password_hash, db, user_id, new_hash)
+
+    token = auth.create_access_token({"sub": user.email})
     return {"access_token": token, "token_type": "bearer"}
 
-# Get current user from token
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+# Get current user from token. The user lookup is cached per token subject, so only
+# the first request (per TTL window) for a user hits the database.
+def get_current_user(request: Request):
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
@@ -58,13 +108,28 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email = payload.get("sub")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    email = payload.get("sub")
+    if not isinstance(email, str) or not email:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    cached = user_cache.get(email)
+    if cached:
+        return cached
+
+    generation = user_cache.generation(email)
+    db = SessionLocal()
+    try:
         user = db.query(models.User).filter(models.User.email == email).first()
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+        cached = CachedUser.from_model(user)
+    finally:
+        db.close()
+
+    user_cache.set(cached, generation)
+    return cached
 
 # Create Document + Auto-share if @mentions
 @router.post("/documents", response_model=schemas.DocumentOut)
@@ -80,109 +145,323 @@ def create_doc(
         visibility=doc.visibility
     )
     db.add(new_doc)
-    db.commit()
-    db.refresh(new_doc)
+    db.flush()
 
-    # Auto-share with @mentioned users
-    mentioned_usernames = set(re.findall(r"@(\w+)", doc.content))
-    for username in mentioned_usernames:
-        mentioned_user = db.query(models.User).filter(models.User.username == username).first()
-        if mentioned_user and mentioned_user.id != current_user.id:
-            already_shared = db.query(models.DocumentShare).filter_by(
-                document_id=new_doc.id,
-                user_id=mentioned_user.id
-            ).first()
-            if not already_shared:
-                db.add(models.DocumentShare(
-                    document_id=new_doc.id,
-                    user_id=mentioned_user.id,
-                    can_edit=False
-                ))
+    revisions.record_revision(db, new_doc)
 
+    # Sharing with @mentioned users and search indexing run after the commit (app/tasks.py)
+    share_with_mentions(db, new_doc)
+    search.index_document(db, new_doc)
     db.commit()
+    db.refresh(new_doc)
     return new_doc
 
-# Get all accessible documents (own + shared + public)
-@router.get("/documents", response_model=List[schemas.DocumentOut])
+# Skip the content column (only a short excerpt is sent) and load all shares in one query
+def list_query(db: Session):
+    return db.query(models.Document).options(
+        defer(models.Document.content),
+        with_expression(
+            models.Document.excerpt,
+            func.substr(models.Document.content, 1, EXCERPT_LENGTH)
+        ),
+        selectinload(models.Document.shares),
+    )
+
+# Get accessible documents (own + shared + public), newest first, one page at a time
+@router.get("/documents", response_model=schemas.DocumentPage)
 def get_documents(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
-    owned = db.query(models.Document).filter(models.Document.author_id == current_user.id)
-    shared = db.query(models.Document).join(models.DocumentShare).filter(
-        models.DocumentShare.user_id == current_user.id
+    try:
+        after = keyset_filter(models.Document.created_at, models.Document.id, cursor) if cursor else true()
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # The page's ids are picked from the indexes first; only those rows are loaded and
+    # get an excerpt
+    page_ids = newest_accessible_ids(current_user.id, limit + 1, after)
+    docs, next_cursor = paginate(
+        list_query(db).filter(models.Document.id.in_(page_ids)),
+        models.Document.created_at, models.Document.id, limit
     )
-    public = db.query(models.Document).filter(models.Document.visibility == "public")
 
-    return owned.union_all(shared).union_all(public).order_by(models.Document.created_at.desc()).distinct().all()
+    return {"items": docs, "next_cursor": next_cursor}
+
+# Stream every accessible document (with its shares) as NDJSON
+@router.get("/documents/export")
+def export_documents(current_user=Depends(get_current_user)):
+    # The stream outlives the request's dependencies, so it owns its session
+    def lines():
+        db = SessionLocal()
+        try:
+            yield from bulk.export_documents(db, accessible_filter(current_user))
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="documents.ndjson"'}
+    )
+
+# Import NDJSON (same format as export) as the current user's documents. The body is
+# read as a stream and written in chunks, one commit per chunk.
+@router.post("/documents/import", response_model=schemas.ImportResult)
+async def import_documents(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    documents = shares = 0
+    chunk = []
+    pending = b""
+    line_no = 0
+
+    async def flush():
+        nonlocal documents, shares, chunk
+        added = await run_in_threadpool(bulk.import_chunk, db, chunk, current_user.id)
+        documents += added[0]
+        shares += added[1]
+        chunk = []
+
+    try:
+        async for data in request.stream():
+            *lines, pending = (pending + data).split(b"\n")
+            for line in lines:
+                line_no += 1
+                record = bulk.parse_line(line_no, line)
+                if record:
+                    chunk.append(record)
+                if len(chunk) >= bulk.CHUNK_SIZE:
+                    await flush()
+        record = bulk.parse_line(line_no + 1, pending)
+        if record:
+            chunk.append(record)
+        await flush()
+    except bulk.InvalidRecord as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{e} ({documents} documents were imported before it)"
+        )
+
+    return {"documents": documents, "shares": shares}
+
+# Metadata needed for conditional requests, without the content column
+def document_validators(db: Session, *criteria):
+    meta = db.query(
+        models.Document.id,
+        models.Document.revision,
+        models.Document.updated_at,
+        models.Document.created_at
+    ).filter(*criteria).first()
+    return http_cache.validators(*meta) if meta else None
 
-# View a public document without auth
+# View a public document without auth (served from the in-process cache when possible)
 @router.get("/documents/public/{doc_id}", response_model=schemas.DocumentOut)
-def view_public_document(doc_id: int, db: Session = Depends(get_db)):
-    doc = db.query(models.Document).filter(
-        models.Document.id == doc_id,
-        models.Document.visibility == "public"
-    ).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Public document not found")
-    return doc
-
-# Search own + shared + public docs (partial, case-insensitive)
-@router.get("/documents/search", response_model=List[schemas.DocumentOut])
+def view_public_document(
+    doc_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    public = (models.Document.id == doc_id, models.Document.visibility == "public")
+
+    cached = http_cache.public_cache.get(doc_id)
+    if cached is None:
+        if http_cache.is_conditional(request):
+            found = document_validators(db, *public)
+            if not found:
+                raise HTTPException(status_code=404, detail="Public document not found")
+            if http_cache.not_modified(request, *found):
+                return http_cache.not_modified_response(*found, public=True)
+
+        generation = http_cache.generation(doc_id)
+        doc = db.query(models.Document).options(
+            selectinload(models.Document.shares)
+        ).filter(*public).first()
+        if not doc:
+            raise HTTPException(status_code=404, detail="Public document not found")
+        # Detach it fully loaded so it can be served after this session is gone
+        db.expunge(doc)
+        etag, last_modified = http_cache.validators(
+            doc.id, doc.revision, doc.updated_at, doc.created_at
+        )
+        cached = http_cache.CachedDocument(doc, etag, last_modified)
+        http_cache.cache_public_document(doc_id, cached, generation)
+
+    if http_cache.not_modified(request, cached.etag, cached.last_modified):
+        return http_cache.not_modified_response(cached.etag, cached.last_modified, public=True)
+    http_cache.set_cache_headers(response, cached.etag, cached.last_modified, public=True)
+    return cached.doc
+
+# Full-text search over own + shared + public docs, best matches first
+@router.get("/documents/search", response_model=schemas.SearchPage)
 def search_documents(
     q: str = "",
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
-    query_string = f"%{q}%"
+    try:
+        offset = decode_offset_cursor(cursor) if cursor else 0
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    owned = db.query(models.Document).filter(
-        models.Document.author_id == current_user.id,
-        or_(
-            models.Document.title.ilike(query_string),
-            models.Document.content.ilike(query_string)
-        )
-    )
+    matched = search.search(db, list_query(db).filter(accessible_filter(current_user)), q)
+    if matched is None:
+        return {"items": [], "next_cursor": None}
 
-    shared = db.query(models.Document).join(models.DocumentShare).filter(
-        models.DocumentShare.user_id == current_user.id,
-        or_(
-            models.Document.title.ilike(query_string),
-            models.Document.content.ilike(query_string)
-        )
-    )
+    query, rank, snippet = matched
+    docs = query.options(
+        with_expression(models.Document.rank, rank),
+        with_expression(models.Document.snippet, snippet),
+    ).order_by(rank.desc(), models.Document.id.desc()).offset(offset).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        if offset + limit <= MAX_OFFSET:
+            next_cursor = encode_offset_cursor(offset + limit)
+    for doc in docs:
+        doc.snippet = search.render_snippet(db, doc.snippet)
+    return {"items": docs, "next_cursor": next_cursor}
 
-    public = db.query(models.Document).filter(
-        models.Document.visibility == "public",
-        or_(
-            models.Document.title.ilike(query_string),
-            models.Document.content.ilike(query_string)
+# Get a single accessible document with full content
+@router.get("/documents/{doc_id}", response_model=schemas.DocumentOut)
+def get_document(
+    doc_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    if http_cache.is_conditional(request):
+        found = document_validators(
+            db, models.Document.id == doc_id, accessible_filter(current_user)
         )
+        if not found:
+            raise HTTPException(status_code=404, detail="Document not found")
+        if http_cache.not_modified(request, *found):
+            return http_cache.not_modified_response(*found, public=False)
+
+    db_doc = get_accessible_document(db, doc_id, current_user)
+    if not db_doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    http_cache.set_cache_headers(
+        response,
+        *http_cache.validators(db_doc.id, db_doc.revision, db_doc.updated_at, db_doc.created_at),
+        public=False
     )
+    return db_doc
 
-    return owned.union_all(shared).union_all(public).order_by(models.Document.created_at.desc()).distinct().all()
+# Revision history (metadata only, newest first)
+@router.get("/documents/{doc_id}/revisions", response_model=List[schemas.RevisionOut])
+def get_revisions(
+    doc_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    if not can_view(db, doc_id, current_user):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return revisions.list_revisions(db, doc_id)
 
-# Update document (only author can)
-@router.put("/documents/{doc_id}", response_model=schemas.DocumentOut)
-def update_doc(
+# Content of one past revision
+@router.get("/documents/{doc_id}/revisions/{number}", response_model=schemas.RevisionDetail)
+def get_revision(
     doc_id: int,
-    doc: schemas.DocumentCreate,
+    number: int,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
+    if not can_view(db, doc_id, current_user):
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    found = revisions.get_revision(db, doc_id, number)
+    if not found:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    revision, content = found
+    revision.content = content
+    return revision
+
+def get_editable_document(db: Session, doc_id: int, current_user):
     db_doc = db.query(models.Document).filter(models.Document.id == doc_id).first()
     if not db_doc:
         raise HTTPException(status_code=404, detail="Document not found")
     if db_doc.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to edit this document")
+    return db_doc
 
-    db_doc.title = doc.title
-    db_doc.content = doc.content
-    db_doc.visibility = doc.visibility
-    db.commit()
+def stale_revision(current_revision: int):
+    return HTTPException(
+        status_code=409,
+        detail={"message": "Document was changed since it was loaded", "revision": current_revision}
+    )
+
+# Apply an edit and commit it. Raises 409 if someone else saved in the meantime.
+def save_edit(db: Session, db_doc, title: str, content: str, visibility: str):
+    doc_id = db_doc.id  # read before the commit expires it, which would cost a reload
+    old_content = db_doc.content
+    changed = title != db_doc.title or content != old_content
+    db_doc.title = title
+    db_doc.content = content
+    db_doc.visibility = visibility
+    if changed:
+        db_doc.revision += 1
+        revisions.record_revision(db, db_doc, previous_content=old_content)
+        # Queued; they run once the commit below succeeds
+        share_with_mentions(db, db_doc, old_content=old_content)
+        search.index_document(db, db_doc)
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        current = db.query(models.Document.revision).filter(models.Document.id == doc_id).scalar()
+        raise stale_revision(current)
+    http_cache.invalidate_document(doc_id)
+
+# Update document (only author can)
+@router.put("/documents/{doc_id}", response_model=schemas.DocumentOut)
+def update_doc(
+    doc_id: int,
+    doc: schemas.DocumentCreate,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    db_doc = get_editable_document(db, doc_id, current_user)
+    save_edit(db, db_doc, doc.title, doc.content, doc.visibility)
     db.refresh(db_doc)
     return db_doc
 
+# Incremental update: apply text ops to the revision the client last saw (only author can)
+@router.patch("/documents/{doc_id}", response_model=schemas.DocumentPatchResult)
+def patch_doc(
+    doc_id: int,
+    patch: schemas.DocumentPatch,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    db_doc = get_editable_document(db, doc_id, current_user)
+    if db_doc.revision != patch.base_revision:
+        raise stale_revision(db_doc.revision)
+
+    try:
+        content = apply_ops(db_doc.content, patch.ops)
+    except InvalidPatch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    save_edit(
+        db,
+        db_doc,
+        patch.title if patch.title is not None else db_doc.title,
+        content,
+        patch.visibility if patch.visibility is not None else db_doc.visibility
+    )
+    return {"id": doc_id, "revision": db_doc.revision}
+
 # Delete document (only author can)
 @router.delete("/documents/{doc_id}")
 def delete_doc(
@@ -196,6 +475,16 @@ def delete_doc(
     if db_doc.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this document")
 
+    search.remove_document(db, db_doc.id)
+    revisions.delete_revisions(db, db_doc.id)
     db.delete(db_doc)
     db.commit()
+    http_cache.invalidate_document(doc_id)
     return {"detail": "Document deleted"}
+
+# Prometheus scrape endpoint (request, SQL, pool and cache metrics for this process)
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if not instrumentation.ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
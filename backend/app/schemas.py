@@ -22,6 +22,25 @@ class DocumentCreate(BaseModel):
     content: str
     visibility: Optional[str] = "private"
 
+# --- Incremental edit: text ops against a known revision ---
+class TextOp(BaseModel):
+    pos: int  # UTF-16 code units, like JS string indexes
+    delete: int = 0
+    insert: str = ""
+
+class DocumentPatch(BaseModel):
+    base_revision: int
+    ops: List[TextOp] = []
+    title: Optional[str] = None
+    visibility: Optional[str] = None
+
+class DocumentPatchResult(BaseModel):
+    id: int
+    revision: int
+
+    class Config:
+        orm_mode = True
+
 # --- Document sharing output ---
 class DocumentShareOut(BaseModel):
     user_id: int
@@ -39,6 +58,54 @@ class DocumentOut(BaseModel):
     author_id: int
     shares: Optional[List[DocumentShareOut]] = [] 
     visibility: str 
+    revision: int
 
     class Config:
         orm_mode = True
+
+# --- Lightweight list item (no full content) ---
+class DocumentListItem(BaseModel):
+    id: int
+    title: str
+    excerpt: Optional[str] = ""
+    created_at: datetime
+    author_id: int
+    shares: Optional[List[DocumentShareOut]] = []
+    visibility: str
+
+    class Config:
+        orm_mode = True
+
+# --- One page of documents + cursor for the next page ---
+class DocumentPage(BaseModel):
+    items: List[DocumentListItem]
+    next_cursor: Optional[str] = None
+
+# --- Search hit: list item + relevance and highlighted snippet ---
+class SearchHit(DocumentListItem):
+    rank: float
+    snippet: Optional[str] = ""
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+
+# --- Revision history ---
+class RevisionOut(BaseModel):
+    number: int
+    kind: str
+    title: str
+    author_id: Optional[int]
+    size: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class RevisionDetail(RevisionOut):
+    content: str
+
+# --- Bulk import summary ---
+class ImportResult(BaseModel):
+    documents: int
+    shares: int
@@ -0,0 +1,146 @@
+import html
+import re
+
+from sqlalchemy import column, func, literal_column, table, text
+from sqlalchemy.orm import Session
+
+from app import models, tasks
+
+# Full-text search over document title + content.
+#
+# Postgres: a GIN index on to_tsvector(title || content) (see models.py). The index is
+# maintained by the row writes themselves, so the index_* hooks below are no-ops.
+# SQLite (local/dev): an FTS5 table keyed by document id. Saves queue the document with
+# index_document() and the FTS rows are rewritten in a background batch after the
+# commit (app/tasks.py); remove_document() runs inside the deleting transaction.
+
+SNIPPET_START = "<mark>"
+SNIPPET_STOP = "</mark>"
+# The database marks matches with these (private-use characters); render_snippet()
+# escapes everything else and only then turns them into the tags above, so text that
+# merely looks like markup never reaches the client as markup
+_MATCH_START = "\ue000"
+_MATCH_STOP = "\ue001"
+
+FTS_TABLE = "documents_fts"
+fts = table(FTS_TABLE, column("rowid"), column("title"), column("content"))
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+# Content is editor HTML; only the text should be searchable
+def strip_tags(value: str) -> str:
+    return html.unescape(_TAG_RE.sub(" ", value or ""))
+
+
+# Every word in the query must match, each as a prefix (so search-as-you-type keeps working)
+def query_terms(q: str):
+    return _TOKEN_RE.findall(q.lower())
+
+
+def init_search(engine):
+    if engine.dialect.name != "sqlite":
+        return
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        if exists:
+            return
+
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} "
+            "USING fts5(title, content, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        # Backfill anything written before the index existed
+        rows = conn.execute(text("SELECT id, title, content FROM documents"))
+        for doc_id, title, content in rows:
+            conn.execute(
+                text(f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+                {"id": doc_id, "title": title, "content": strip_tags(content)}
+            )
+
+
+# Call after the document has an id and before the commit
+def index_document(db: Session, doc: models.Document):
+    if _dialect(db) != "sqlite":
+        return
+    tasks.enqueue(db, "search_index", {"document_id": doc.id})
+
+
+@tasks.handler("search_index")
+def reindex_documents(db: Session, payloads):
+    doc_ids = {payload["document_id"] for payload in payloads}
+    # Delete first: that takes SQLite's write lock, so a concurrent delete can't slip in
+    # between reading a document and re-inserting its row
+    db.execute(fts.delete().where(fts.c.rowid.in_(doc_ids)))
+    rows = db.query(models.Document.id, models.Document.title, models.Document.content).filter(
+        models.Document.id.in_(doc_ids)
+    ).all()
+    if rows:
+        db.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, title, content) VALUES (:id, :title, :content)"),
+            [{"id": doc_id, "title": title, "content": strip_tags(content)} for doc_id, title, content in rows]
+        )
+
+
+def remove_document(db: Session, doc_id: int):
+    if _dialect(db) != "sqlite":
+        return
+
+    db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": doc_id})
+
+
+def search(db: Session, query, q: str):
+    """Restrict a Document query to matches for `q`.
+
+    Returns (query, rank, snippet): the filtered query plus rank and snippet column
+    expressions for the caller to select and order by (higher rank is better).
+    Returns None if `q` has no searchable terms.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return None
+
+    if _dialect(db) == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = query.join(fts, literal_column(f"{FTS_TABLE}.rowid") == models.Document.id).filter(
+            literal_column(FTS_TABLE).op("MATCH")(match)
+        )
+        rank = -func.bm25(literal_column(FTS_TABLE))
+        snippet = func.snippet(
+            literal_column(FTS_TABLE), -1, _MATCH_START, _MATCH_STOP, "…", 16
+        )
+        return query, rank, snippet
+
+    tsquery = func.to_tsquery(
+        literal_column("'english'::regconfig"),
+        " & ".join(f"{term}:*" for term in terms)
+    )
+    vector = models.document_search_vector()
+    query = query.filter(vector.op("@@")(tsquery))
+    rank = func.ts_rank_cd(vector, tsquery)
+    snippet = func.ts_headline(
+        literal_column("'english'::regconfig"),
+        func.regexp_replace(func.coalesce(models.Document.content, ""), "<[^>]+>", " ", "g"),
+        tsquery,
+        f"StartSel={_MATCH_START}, StopSel={_MATCH_STOP}, MaxWords=30, MinWords=10, MaxFragments=2"
+    )
+    return query, rank, snippet
+
+
+def render_snippet(db: Session, raw: str) -> str:
+    """Turn a snippet from search() into safe HTML: escaped text plus <mark> tags."""
+    if raw is None:
+        return None
+    if _dialect(db) != "sqlite":
+        # Postgres highlights the stored HTML with its tags stripped, entities intact
+        raw = html.unescape(raw)
+    return html.escape(raw, quote=False).replace(_MATCH_START, SNIPPET_START).replace(_MATCH_STOP, SNIPPET_STOP)
@@ -0,0 +1,315 @@
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.metrics import Callback, Counter, Histogram
+
+# Post-commit background work: side effects of a save (mention sharing, search
+# indexing, ...) run after the request has answered, so writes only pay for the
+# primary write.
+#
+#   tasks.enqueue(db, "share_mentions", {"document_id": 1, "usernames": ["ann"]})
+#
+# enqueue() adds a background_jobs row to the caller's transaction. Only when that
+# transaction commits is the job handed to the worker; on rollback it never existed.
+# Jobs of one kind that arrive within BATCH_WINDOW_SECONDS of each other run as a
+# single batch: the handler gets every payload at once and can resolve them with one
+# query per table. A batch's effects and the deletion of its job rows commit together.
+#
+# At most TASK_WORKERS batches run at a time. A failed batch is retried job by job
+# (so one bad payload can't keep failing its neighbours) with exponential backoff;
+# after MAX_ATTEMPTS a job is marked "failed" and left in the table.
+#
+# Jobs survive restarts: every SWEEP_INTERVAL_SECONDS the worker picks up queued rows
+# that have been due for STALE_AFTER_SECONDS without finishing - left behind by a
+# process that stopped, or by another worker process. Handlers must therefore be
+# idempotent: a job may run more than once, never zero times.
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "2"))
+BATCH_WINDOW_SECONDS = 0.05
+BATCH_MAX_SIZE = 500
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 1  # 1, 2, 4, 8 s, plus jitter
+STALE_AFTER_SECONDS = 60
+SWEEP_INTERVAL_SECONDS = 30
+
+log = logging.getLogger("app.tasks")
+
+jobs_total = Counter(
+    "background_jobs_total", "Background jobs by kind and outcome (done, retry, failed).", ("kind", "outcome")
+)
+batch_duration = Histogram(
+    "background_job_batch_duration_seconds", "Time to run one batch of background jobs.", ("kind",)
+)
+
+_handlers = {}
+_PENDING_JOBS = "tasks.pending_jobs"
+_ON_COMMIT = "tasks.on_commit"
+
+
+def handler(kind: str):
+    """Register fn(db, payloads) as the handler for `kind`. It must not commit."""
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def enqueue(db: Session, kind: str, payload: dict):
+    """Queue a job as part of `db`'s transaction; it runs after that transaction commits."""
+    job = models.BackgroundJob(kind=kind, payload=payload, run_after=_utcnow())
+    db.add(job)
+    db.info.setdefault(_PENDING_JOBS, []).append((job, kind, payload))
+
+
+def on_commit(db: Session, fn, *args):
+    """Call fn(*args) in this process right after `db`'s transaction commits (not durable)."""
+    db.info.setdefault(_ON_COMMIT, []).append((fn, args))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _after_commit(session):
+    callbacks = session.info.pop(_ON_COMMIT, ())
+    pending = session.info.pop(_PENDING_JOBS, ())
+    for fn, args in callbacks:
+        try:
+            fn(*args)
+        except Exception:
+            log.exception("on_commit callback %r failed", fn)
+    if pending:
+        # Attributes are expired by now; the identity key is not
+        task_queue.submit([Job(inspect(job).identity[0], kind, payload) for job, kind, payload in pending])
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_ON_COMMIT, None)
+    session.info.pop(_PENDING_JOBS, None)
+
+
+class Job:
+    __slots__ = ("id", "kind", "payload", "attempts")
+
+    def __init__(self, id: int, kind: str, payload: dict, attempts: int = 0):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+
+    def __lt__(self, other):
+        return self.id < other.id
+
+
+class TaskQueue:
+    def __init__(self, session_factory=SessionLocal, workers: int = TASK_WORKERS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._batches = {}  # kind -> (monotonic time the oldest job arrived, [jobs])
+        self._retries = []  # heap of (due monotonic time, job)
+        self._known = set()  # ids queued or running in this process
+        self._running = 0
+        self._thread = None
+        self._executor = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tasks")
+            self._thread = threading.Thread(target=self._dispatch, name="tasks-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Stop dispatching and wait for running batches. Queued jobs stay in the table."""
+        with self._cond:
+            thread, executor = self._thread, self._executor
+            if thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        executor.shutdown(wait=True)
+        with self._cond:
+            self._thread = self._executor = None
+            self._batches.clear()
+            self._retries.clear()
+            self._known.clear()
+
+    def submit(self, jobs):
+        self.start()
+        now = time.monotonic()
+        with self._cond:
+            for job in jobs:
+                if job.id in self._known:
+                    continue
+                self._known.add(job.id)
+                if job.attempts:
+                    heapq.heappush(self._retries, (now, job))
+                else:
+                    self._batches.setdefault(job.kind, (now, []))[1].append(job)
+            self._cond.notify_all()
+
+    def pending(self) -> int:
+        return len(self._known)
+
+    def wait_idle(self, timeout: float = 10) -> bool:
+        """Wait until nothing is waiting for its batch window or running (retries may be scheduled)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._batches or self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _take_due(self, now):
+        due = []
+        for kind, (first_seen, jobs) in list(self._batches.items()):
+            if self._running + len(due) >= self.workers:
+                return due
+            if now - first_seen >= BATCH_WINDOW_SECONDS or len(jobs) >= BATCH_MAX_SIZE:
+                due.append((kind, jobs[:BATCH_MAX_SIZE]))
+                if len(jobs) > BATCH_MAX_SIZE:
+                    self._batches[kind] = (first_seen, jobs[BATCH_MAX_SIZE:])
+                else:
+                    del self._batches[kind]
+        while self._retries and self._retries[0][0] <= now and self._running + len(due) < self.workers:
+            _, job = heapq.heappop(self._retries)
+            due.append((job.kind, [job]))
+        return due
+
+    def _next_wakeup(self, now, next_sweep):
+        wakeups = [next_sweep]
+        if self._running < self.workers:
+            wakeups.extend(first_seen + BATCH_WINDOW_SECONDS for first_seen, _ in self._batches.values())
+            if self._retries:
+                wakeups.append(self._retries[0][0])
+        return max(0, min(wakeups) - now)
+
+    def _dispatch(self):
+        next_sweep = time.monotonic()
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                due = self._take_due(now)
+                if not due and now < next_sweep:
+                    self._cond.wait(self._next_wakeup(now, next_sweep))
+                    continue
+                self._running += len(due)
+
+            for kind, jobs in due:
+                self._executor.submit(self._execute, kind, jobs)
+            if now >= next_sweep:
+                next_sweep = now + SWEEP_INTERVAL_SECONDS
+                self._sweep()
+
+    def _sweep(self):
+        cutoff = _utcnow() - timedelta(seconds=STALE_AFTER_SECONDS)
+        db = self.session_factory()
+        try:
+            rows = db.execute(
+                select(
+                    models.BackgroundJob.id,
+                    models.BackgroundJob.kind,
+                    models.BackgroundJob.payload,
+                    models.BackgroundJob.attempts
+                ).where(
+                    models.BackgroundJob.status == "queued",
+                    models.BackgroundJob.run_after <= cutoff
+                ).order_by(models.BackgroundJob.id).limit(BATCH_MAX_SIZE * self.workers)
+            ).all()
+        except Exception:
+            log.exception("Could not read queued background jobs")
+            return
+        finally:
+            db.close()
+        if rows:
+            self.submit([Job(row.id, row.kind, row.payload, row.attempts) for row in rows])
+
+    def _execute(self, kind, jobs):
+        started = time.perf_counter()
+        db = self.session_factory()
+        try:
+            fn = _handlers.get(kind)
+            if fn is None:
+                raise LookupError(f"No handler registered for {kind!r} jobs")
+            fn(db, [job.payload for job in jobs])
+            db.execute(delete(models.BackgroundJob).where(
+                models.BackgroundJob.id.in_([job.id for job in jobs])
+            ))
+            db.commit()
+            jobs_total.inc((kind, "done"), len(jobs))
+            done = jobs
+        except Exception as e:
+            db.rollback()
+            done = self._failed(db, kind, jobs, e)
+        finally:
+            db.close()
+            batch_duration.observe(time.perf_counter() - started, (kind,))
+
+        with self._cond:
+            self._running -= 1
+            self._known.difference_update(job.id for job in done)
+            self._cond.notify_all()
+
+    def _failed(self, db, kind, jobs, error):
+        """Record a failed batch; schedule retries. Returns the jobs given up on."""
+        now = time.monotonic()
+        given_up, retries, rows = [], [], []
+        for job in jobs:
+            job.attempts += 1
+            if job.attempts >= MAX_ATTEMPTS:
+                given_up.append(job)
+                rows.append({"id": job.id, "attempts": job.attempts, "status": "failed", "last_error": repr(error)})
+                continue
+            delay = RETRY_BASE_SECONDS * 2 ** (job.attempts - 1) * (1 + random.random() / 2)
+            retries.append((now + delay, job))
+            rows.append({
+                "id": job.id,
+                "attempts": job.attempts,
+                "run_after": _utcnow() + timedelta(seconds=delay),
+                "last_error": repr(error),
+            })
+
+        log.warning("%d %s job(s) failed (%r); %d will be retried", len(jobs), kind, error, len(retries))
+        for job in given_up:
+            log.error("Giving up on %s job %d after %d attempts", kind, job.id, job.attempts)
+        jobs_total.inc((kind, "retry"), len(retries))
+        jobs_total.inc((kind, "failed"), len(given_up))
+
+        try:
+            db.execute(update(models.BackgroundJob), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            log.exception("Could not record failed %s jobs", kind)
+
+        with self._cond:
+            for item in retries:
+                heapq.heappush(self._retries, item)
+        return given_up
+
+
+task_queue = TaskQueue()
+
+Callback("background_jobs_pending", "Background jobs queued or running in this process.", "gauge", task_queue.pending)
@@ -0,0 +1,129 @@
+import json
+import threading
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+
+from app import models, tasks
+from app.cache import MemoryBackend
+from app.metrics import Callback
+
+# Authenticated-user cache: token subject (email) -> user snapshot, so the common
+# authenticated request validates the JWT in-process and never touches the database.
+# Entries expire after USER_CACHE_TTL_SECONDS and are dropped as soon as an update or
+# delete of the user row through the ORM commits. As in http_cache, a generation per
+# stripe of emails stops a lookup that raced that commit from caching the old row.
+
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 10_000
+GENERATION_STRIPES = 1024
+
+
+# What routes get as current_user: a plain, immutable copy that is safe to share
+# between requests and threads (unlike an ORM instance bound to a closed session)
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    email: str
+    username: str
+
+    @classmethod
+    def from_model(cls, user: models.User):
+        return cls(id=user.id, email=user.email, username=user.username)
+
+
+class RedisBackend:
+    """Shared cache for multi-worker deployments, so an invalidation reaches every worker."""
+
+    def __init__(self, url: str, ttl: float = USER_CACHE_TTL_SECONDS, prefix: str = "user:"):
+        import redis  # optional dependency, only needed when this backend is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return CachedUser(**json.loads(raw)) if raw else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(asdict(value)), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+
+class UserCache:
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+        self.hits = 0
+        self.misses = 0
+        self._generations = [0] * GENERATION_STRIPES
+        self._generations_lock = threading.Lock()
+
+    def get(self, email: str):
+        user = self.backend.get(email)
+        # Counters are best-effort; a lost increment under contention is fine
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+
+    # Read before loading the user; pass to set() so a load that raced an invalidation
+    # isn't cached
+    def generation(self, email: str) -> int:
+        return self._generations[hash(email) % GENERATION_STRIPES]
+
+    def set(self, user: CachedUser, loaded_generation: int) -> bool:
+        with self._generations_lock:
+            if self.generation(user.email) != loaded_generation:
+                return False
+            self.backend.set(user.email, user)
+            return True
+
+    def invalidate(self, email: str):
+        with self._generations_lock:
+            self._generations[hash(email) % GENERATION_STRIPES] += 1
+            self.backend.delete(email)
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.backend)}
+
+
+user_cache = UserCache()
+
+# Hits and misses are counted in this process; size is the backend's (shared, for Redis)
+Callback("user_cache_hits_total", "Authenticated-user cache hits.", "counter", lambda: user_cache.hits)
+Callback("user_cache_misses_total", "Authenticated-user cache misses.", "counter", lambda: user_cache.misses)
+Callback("user_cache_size", "Entries in the authenticated-user cache.", "gauge", lambda: len(user_cache.backend))
+
+
+# Swap in a shared backend (e.g. RedisBackend) at startup
+def configure_backend(backend):
+    user_cache.backend = backend
+
+
+# These fire at flush, while other requests can still read the old row; the entries
+# are dropped once the change commits
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    db = object_session(target)
+    tasks.on_commit(db, user_cache.invalidate, target.email)
+    # An email change must also drop the entry cached under the old address
+    for old_email in inspect(target).attrs.email.history.deleted or ():
+        tasks.on_commit(db, user_cache.invalidate, old_email)
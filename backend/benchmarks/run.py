@@ -0,0 +1,359 @@
+"""Route benchmarks with SQL statement budgets.
+
+Seeds a synthetic dataset into a throwaway SQLite database, drives every route in
+app/routes.py through the ASGI app in-process, and reports latency percentiles,
+throughput and SQL statements per request. Exits non-zero if any route goes over its
+statement budget, so N+1 regressions fail loudly.
+
+    cd backend
+    python -m benchmarks.run                       # JSON report on stdout
+    python -m benchmarks.run --documents 20000 --output bench.json
+    python -m benchmarks.run --compare-metrics     # cost of METRICS_ENABLED=1 vs 0
+
+Needs httpx (for the in-process test client) on top of requirements.txt.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = (
+    "alpha beta gamma delta release roadmap design review incident deploy pipeline "
+    "budget quarterly report meeting notes onboarding checklist architecture api "
+    "latency cache index search migration backup policy security audit"
+).split()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--min-doc-size", type=int, default=200, help="characters")
+    parser.add_argument("--max-doc-size", type=int, default=20000, help="characters")
+    parser.add_argument("--shares-per-doc", type=int, default=3, help="maximum, random per document")
+    parser.add_argument("--public-ratio", type=float, default=0.3)
+    parser.add_argument("--mentions", type=int, default=25, help="@mentions in created documents")
+    parser.add_argument("--iterations", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--auth-iterations", type=int, default=5, help="timed /register and /login requests (bcrypt)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", help="SQLAlchemy URL (default: a temporary SQLite file)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--metrics", action=argparse.BooleanOptionalAction, default=True,
+                        help="run with request/SQL instrumentation (METRICS_ENABLED)")
+    parser.add_argument("--compare-metrics", action="store_true",
+                        help="run the suite with metrics off and on, alternating, and report the per-route difference")
+    parser.add_argument("--rounds", type=int, default=3, help="off/on pairs for --compare-metrics")
+    return parser.parse_args(argv)
+
+
+def text_of(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return "<p>" + " ".join(words)[:size] + "</p>"
+
+
+def seed(args, rng):
+    from app import auth, bulk, models
+    from app.database import SessionLocal
+    from sqlalchemy import insert
+
+    db = SessionLocal()
+    try:
+        # Hash once: bcrypt cost is not what is being measured here
+        hashed = auth.hash_password("benchmark")
+        db.execute(insert(models.User), [
+            {"email": f"user{i}@example.com", "username": f"user{i}", "hashed_password": hashed}
+            for i in range(args.users)
+        ])
+        db.commit()
+        user_ids = [row[0] for row in db.query(models.User.id).order_by(models.User.id)]
+
+        start = datetime(2024, 1, 1)
+        records = []
+        for i in range(args.documents):
+            author = rng.choice(user_ids)
+            shared = rng.sample(user_ids, min(len(user_ids), rng.randint(0, args.shares_per_doc)))
+            records.append({
+                "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}",
+                "content": text_of(rng, rng.randint(args.min_doc_size, args.max_doc_size)),
+                "visibility": "public" if rng.random() < args.public_ratio else "private",
+                "author_id": author,
+                "created_at": start + timedelta(seconds=i),
+                "shares": [{"user_id": user_id, "can_edit": False} for user_id in shared],
+            })
+            if len(records) >= bulk.CHUNK_SIZE:
+                bulk.import_chunk(db, records)
+                records = []
+        bulk.import_chunk(db, records)
+        return user_ids
+    finally:
+        db.close()
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def measure(name, counter, settle, request, iterations, budget, setup=None, expect=(200,)):
+    # One untimed warm-up (fills the user cache, statement caches, ...)
+    if setup:
+        setup()
+    request()
+    settle()
+
+    latencies = []
+    statements = []
+    background = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+            settle()
+        counter.count = 0
+        started = time.perf_counter()
+        response = request()
+        latencies.append((time.perf_counter() - started) * 1000)
+        statements.append(counter.count)
+        if response.status_code not in expect:
+            raise RuntimeError(f"{name}: unexpected {response.status_code}: {response.text[:200]}")
+        # Post-commit jobs run here, outside the timing and the request's budget
+        counter.count = 0
+        settle()
+        background.append(counter.count)
+
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(iterations / (sum(latencies) / 1000), 1),
+        "statements": {"min": min(statements), "max": max(statements)},
+        "background_statements": {"min": min(background), "max": max(background)},
+        "statement_budget": budget,
+        "within_budget": max(statements) <= budget,
+    }
+
+
+def run(args):
+    rng = random.Random(args.seed)
+
+    from fastapi.testclient import TestClient
+    from app import auth, bulk, http_cache, instrumentation, tasks
+    from app.database import engine
+    from app.main import app
+
+    seed_started = time.perf_counter()
+    user_ids = seed(args, rng)
+    seed_seconds = time.perf_counter() - seed_started
+
+    client = TestClient(app)
+    viewer = {"Authorization": "Bearer " + auth.create_access_token({"sub": "user0@example.com"})}
+    counter = StatementCounter(engine)
+
+    mention_text = " ".join(f"@user{i}" for i in rng.sample(range(1, args.users), min(args.mentions, args.users - 1)))
+    body = {"title": "Benchmark page", "content": text_of(rng, 2000) + mention_text, "visibility": "public"}
+    own = client.post("/documents", json=body, headers=viewer).json()
+    own_id = own["id"]
+    state = {"revision": own["revision"], "registered": 0, "edits": 0, "victim": None}
+
+    first_page = client.get("/documents", params={"limit": 50}, headers=viewer).json()
+    accessible = sum(1 for _ in client.get("/documents/export", headers=viewer).iter_lines() if _)
+    etag = client.get(f"/documents/public/{own_id}").headers["etag"]
+    private_etag = client.get(f"/documents/{own_id}", headers=viewer).headers["etag"]
+    import_body = "".join(
+        json.dumps({"title": f"Imported {i}", "content": text_of(rng, 1000), "shares": [{"user_id": user_ids[1]}]}) + "\n"
+        for i in range(20)
+    )
+
+    def register():
+        state["registered"] += 1
+        n = state["registered"]
+        return client.post("/register", json={
+            "email": f"new{n}@example.com", "username": f"new{n}", "password": "benchmark"
+        })
+
+    def patch():
+        response = client.patch(f"/documents/{own_id}", json={
+            "base_revision": state["revision"], "ops": [{"pos": 3, "insert": "x"}]
+        }, headers=viewer)
+        state["revision"] = response.json().get("revision", state["revision"])
+        return response
+
+    def put():
+        # New content every call: an unchanged save skips the revision and its jobs
+        state["edits"] += 1
+        content = body["content"] + f" edit {state['edits']}"
+        response = client.put(f"/documents/{own_id}", json={**body, "content": content}, headers=viewer)
+        state["revision"] = response.json().get("revision", state["revision"])
+        return response
+
+    def new_victim():
+        state["victim"] = client.post("/documents", json={"title": "Delete me", "content": "bye"}, headers=viewer).json()["id"]
+
+    # SQLite can't return ids in parameter order from a multi-row INSERT, so
+    # SQLAlchemy falls back to one INSERT per imported document there
+    import_budget = 4 + (1 if engine.dialect.name == "postgresql" else import_body.count("\n"))
+
+    # name -> (request, statement budget, iterations, setup, expected statuses)
+    # Budgets are for this SQLite harness; the FTS5 index adds statements that
+    # Postgres' GIN index doesn't need.
+    routes = {
+        "POST /register": (register, 2, args.auth_iterations, None, (200,)),
+        "POST /login": (lambda: client.post("/login", json={"email": "user1@example.com", "password": "benchmark"}),
+                        1, args.auth_iterations, None, (200,)),
+        "POST /documents (with mentions)": (lambda: client.post("/documents", json=body, headers=viewer),
+                                            7, args.iterations, None, (200,)),
+        "GET /documents": (lambda: client.get("/documents", params={"limit": 50}, headers=viewer),
+                           2, args.iterations, None, (200,)),
+        "GET /documents (next page)": (lambda: client.get("/documents", params={"limit": 50, "cursor": first_page["next_cursor"]}, headers=viewer),
+                                       2, args.iterations, None, (200,)),
+        "GET /documents/export": (lambda: client.get("/documents/export", headers=viewer),
+                                  1 + math.ceil(accessible / bulk.CHUNK_SIZE), max(1, args.iterations // 10), None, (200,)),
+        "POST /documents/import": (lambda: client.post("/documents/import", content=import_body, headers=viewer),
+                                   import_budget, max(1, args.iterations // 10), None, (200,)),
+        "GET /documents/public/{id} (cached)": (lambda: client.get(f"/documents/public/{own_id}"),
+                                                0, args.iterations, None, (200,)),
+        "GET /documents/public/{id} (cold)": (lambda: client.get(f"/documents/public/{own_id}"),
+                                              2, args.iterations, http_cache.public_cache.clear, (200,)),
+        "GET /documents/public/{id} (If-None-Match, cold)": (lambda: client.get(f"/documents/public/{own_id}", headers={"If-None-Match": etag}),
+                                                             1, args.iterations, http_cache.public_cache.clear, (304,)),
+        "GET /documents/search": (lambda: client.get("/documents/search", params={"q": "deploy pipe"}, headers=viewer),
+                                  2, args.iterations, None, (200,)),
+        "GET /documents/{id}": (lambda: client.get(f"/documents/{own_id}", headers=viewer),
+                                2, args.iterations, None, (200,)),
+        "GET /documents/{id} (If-None-Match)": (lambda: client.get(f"/documents/{own_id}", headers={**viewer, "If-None-Match": private_etag}),
+                                                1, args.iterations, None, (304,)),
+        "GET /documents/{id}/revisions": (lambda: client.get(f"/documents/{own_id}/revisions", headers=viewer),
+                                          2, args.iterations, None, (200,)),
+        "GET /documents/{id}/revisions/{n}": (lambda: client.get(f"/documents/{own_id}/revisions/1", headers=viewer),
+                                              2, args.iterations, None, (200,)),
+        "PUT /documents/{id}": (put, 7, args.iterations, None, (200,)),
+        "PATCH /documents/{id}": (patch, 6, args.iterations, None, (200,)),
+        "DELETE /documents/{id}": (lambda: client.delete(f"/documents/{state['victim']}", headers=viewer),
+                                   5, args.iterations, new_victim, (200,)),
+        # Rendering reads in-process state only; a 404 when metrics are off
+        "GET /metrics": (lambda: client.get("/metrics"),
+                         0, args.iterations, None, (200,) if instrumentation.ENABLED else (404,)),
+    }
+
+    results = {}
+    for name, (request, budget, iterations, setup, expect) in routes.items():
+        results[name] = measure(name, counter, tasks.task_queue.wait_idle, request, iterations, budget, setup, expect)
+        print(
+            f"{name:<50} p50 {results[name]['p50_ms']:>8.2f} ms  p99 {results[name]['p99_ms']:>8.2f} ms  "
+            f"sql {results[name]['statements']['max']:>3} / {budget:<3}"
+            + ("" if results[name]["within_budget"] else "  OVER BUDGET"),
+            file=sys.stderr
+        )
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "database", "compare_metrics", "rounds")},
+        "database": engine.dialect.name,
+        "metrics_enabled": instrumentation.ENABLED,
+        "seed_seconds": round(seed_seconds, 2),
+        "accessible_documents": accessible,
+        "routes": results,
+        "within_budget": all(result["within_budget"] for result in results.values()),
+    }
+
+
+# METRICS_ENABLED is read at import, so every run is its own process (same seed, fresh
+# temporary database unless --database is given). Off and on runs alternate and each
+# route's latencies are compared as medians over the rounds, so drift in machine load
+# doesn't read as overhead.
+def compare_metrics(args, argv):
+    skip = {"--compare-metrics", "--metrics", "--no-metrics"}
+    argv = [arg for arg in argv if arg not in skip and not arg.startswith("--rounds")]
+    for flag in ("--output", "--rounds"):
+        if flag in argv:
+            index = argv.index(flag)
+            del argv[index:index + 2]
+
+    reports = {"--no-metrics": [], "--metrics": []}
+    for _ in range(args.rounds):
+        for flag in reports:
+            with tempfile.NamedTemporaryFile(suffix=".json") as output:
+                subprocess.run(
+                    [sys.executable, "-m", "benchmarks.run", *argv, flag, "--output", output.name],
+                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    check=False
+                )
+                with open(output.name) as f:
+                    reports[flag].append(json.load(f))
+
+    def medians(runs, name):
+        return {
+            key: round(statistics.median(run["routes"][name][key] for run in runs), 3)
+            for key in ("p50_ms", "p95_ms", "mean_ms")
+        }
+
+    routes = {}
+    for name in reports["--metrics"][0]["routes"]:
+        off, on = medians(reports["--no-metrics"], name), medians(reports["--metrics"], name)
+        routes[name] = {
+            "metrics_off": off,
+            "metrics_on": on,
+            "overhead_ms": {key: round(on[key] - off[key], 3) for key in off},
+        }
+    return {
+        "config": reports["--metrics"][0]["config"],
+        "rounds": args.rounds,
+        "routes": routes,
+        "within_budget": all(run["within_budget"] for runs in reports.values() for run in runs),
+    }
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.compare_metrics:
+        report = compare_metrics(args, argv)
+    else:
+        # Must be set before the app (and its engine) is imported
+        os.environ["DATABASE_URL"] = args.database or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+        os.environ["METRICS_ENABLED"] = "1" if args.metrics else "0"
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        from app import auth, tasks
+
+        try:
+            report = run(args)
+        finally:
+            tasks.task_queue.stop()
+            auth.shutdown_password_pool()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0 if report["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+-- Full-text search index for /documents/search (Postgres).
+-- New databases get this from create_all(); run this once on existing ones.
+-- The expression must match models.search_vector() exactly.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_search
+    ON documents
+    USING gin (to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(content, '')));
@@ -0,0 +1,22 @@
+-- Indexes behind app/access.py (Postgres).
+-- New databases get these from create_all(); run this once on existing ones.
+
+-- Drop duplicate shares (keep the oldest row) so the unique index can be built.
+DELETE FROM document_shares a
+    USING document_shares b
+    WHERE a.user_id = b.user_id
+      AND a.document_id = b.document_id
+      AND a.id > b.id;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_document_shares_user_document
+    ON document_shares (user_id, document_id);
+ALTER TABLE document_shares
+    ADD CONSTRAINT uq_document_shares_user_document
+    UNIQUE USING INDEX uq_document_shares_user_document;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_shares_document_id
+    ON document_shares (document_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_author_created
+    ON documents (author_id, created_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_visibility_created
+    ON documents (visibility, created_at);
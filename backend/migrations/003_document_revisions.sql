@@ -0,0 +1,5 @@
+-- Revision history (app/revisions.py).
+-- create_all() creates the document_revisions table; existing documents tables
+-- need the revision counter added by hand.
+ALTER TABLE documents
+    ADD COLUMN IF NOT EXISTS revision INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,4 @@
+-- Snapshot lookups in app/revisions.py (Postgres).
+-- New databases get this from create_all(); run this once on existing ones.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_revisions_document_kind_number
+    ON document_revisions (document_id, kind, number);
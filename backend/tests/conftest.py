@@ -0,0 +1,60 @@
+import os
+import tempfile
+
+# The app builds its engine at import time: point it at a throwaway SQLite file first
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from app import auth, http_cache, models, search, tasks
+from app.database import SessionLocal, engine
+from app.main import app
+from app.user_cache import user_cache
+
+PASSWORD = "secret"
+
+
+@pytest.fixture(scope="session")
+def hashed_password():
+    # bcrypt is slow on purpose; hash once for every test user
+    hashed = auth.hash_password(PASSWORD)
+    yield hashed
+    auth.shutdown_password_pool()
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    yield
+    tasks.task_queue.stop()
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+        conn.execute(text(f"DELETE FROM {search.FTS_TABLE}"))
+    http_cache.public_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(db, hashed_password):
+    """Create a user; returns (user id, auth headers)."""
+    def make(username):
+        user = models.User(email=f"{username}@example.com", username=username, hashed_password=hashed_password)
+        db.add(user)
+        db.commit()
+        token = auth.create_access_token({"sub": user.email})
+        return user.id, {"Authorization": f"Bearer {token}"}
+    return make
@@ -0,0 +1,68 @@
+import os
+
+from app import auth, models
+from app.database import engine
+
+from conftest import PASSWORD
+
+
+def test_login_returns_a_token(client, make_user):
+    make_user("ann")
+    response = client.post("/login", json={"email": "ann@example.com", "password": PASSWORD})
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    wrong = client.post("/login", json={"email": "ann@example.com", "password": "nope"})
+    assert wrong.status_code == 400
+
+
+def test_no_connection_is_held_while_hashing(client, make_user, monkeypatch):
+    make_user("ann")
+    baseline = engine.pool.checkedout()  # the test's own session
+    checked_out = []
+
+    async def verify(plain, hashed):
+        checked_out.append(engine.pool.checkedout())
+        return auth.verify_and_update_password(plain, hashed)
+
+    async def hash_password(password):
+        checked_out.append(engine.pool.checkedout())
+        return auth.hash_password(password)
+
+    monkeypatch.setattr(auth, "verify_and_update_password_async", verify)
+    monkeypatch.setattr(auth, "hash_password_async", hash_password)
+
+    assert client.post("/login", json={"email": "ann@example.com", "password": PASSWORD}).status_code == 200
+    assert client.post("/register", json={
+        "email": "bob@example.com", "username": "bob", "password": PASSWORD
+    }).status_code == 200
+    assert checked_out == [baseline, baseline]
+
+
+def test_outdated_hash_is_replaced_on_login(client, db, make_user, monkeypatch):
+    user_id, _ = make_user("ann")
+    monkeypatch.setattr(auth, "verify_and_update_password", lambda plain, hashed: (True, "rehashed"))
+
+    async def verify(plain, hashed):
+        return auth.verify_and_update_password(plain, hashed)
+
+    monkeypatch.setattr(auth, "verify_and_update_password_async", verify)
+    assert client.post("/login", json={"email": "ann@example.com", "password": PASSWORD}).status_code == 200
+    db.expire_all()
+    assert db.get(models.User, user_id).hashed_password == "rehashed"
+
+
+def _crash(*args):
+    os._exit(1)
+
+
+def test_dead_password_worker_is_replaced(client, make_user, monkeypatch):
+    make_user("ann")
+    auth.shutdown_password_pool()
+    monkeypatch.setattr(auth, "verify_and_update_password", _crash)
+    response = client.post("/login", json={"email": "ann@example.com", "password": PASSWORD})
+    assert response.status_code == 503
+
+    monkeypatch.undo()
+    response = client.post("/login", json={"email": "ann@example.com", "password": PASSWORD})
+    assert response.status_code == 200
@@ -0,0 +1,56 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import bulk, models
+
+
+def ndjson(*records):
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def test_export_import_round_trip(client, make_user):
+    bob_id, _ = make_user("bob")
+    _, headers = make_user("ann")
+    body = ndjson(
+        {"title": "One", "content": "<p>first</p>", "shares": [{"user_id": bob_id, "can_edit": True}]},
+        {"title": "Two", "content": "second", "visibility": "public"},
+    )
+
+    imported = client.post("/documents/import", content=body, headers=headers)
+    assert imported.json() == {"documents": 2, "shares": 1}
+
+    exported = [json.loads(line) for line in client.get("/documents/export", headers=headers).iter_lines() if line]
+    assert [(doc["title"], doc["content"], doc["visibility"]) for doc in exported] == [
+        ("One", "<p>first</p>", "private"),
+        ("Two", "second", "public"),
+    ]
+    assert exported[0]["shares"] == [{"user_id": bob_id, "can_edit": True}]
+
+
+def test_invalid_utf8_is_a_client_error(client, make_user):
+    _, headers = make_user("ann")
+    body = ndjson({"title": "fine"}).encode() + b'{"title":"\xff"}\n'
+
+    response = client.post("/documents/import", content=body, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 2: not valid UTF-8")
+
+
+def test_parse_line_rejects_bad_records():
+    with pytest.raises(bulk.InvalidRecord, match="Line 3"):
+        bulk.parse_line(3, b"not json")
+    with pytest.raises(bulk.InvalidRecord, match="visibility"):
+        bulk.parse_line(1, json.dumps({"title": "x", "visibility": "secret"}))
+    assert bulk.parse_line(1, b"   ") is None
+
+
+def test_import_without_created_at_uses_utc_now(db, make_user):
+    ann_id, _ = make_user("ann")
+    bulk.import_chunk(db, [bulk.parse_line(1, json.dumps({"title": "Now"}))], author_id=ann_id)
+
+    created_at = db.query(models.Document.created_at).scalar()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)  # SQLite drops the offset; the value is UTC
+    assert abs(datetime.now(timezone.utc) - created_at) < timedelta(minutes=1)
@@ -0,0 +1,45 @@
+from app import http_cache
+
+
+def create_public(client, headers):
+    response = client.post(
+        "/documents", json={"title": "Public", "content": "v1", "visibility": "public"}, headers=headers
+    )
+    return response.json()
+
+
+def test_conditional_get_and_edit(client, make_user):
+    _, headers = make_user("ann")
+    doc = create_public(client, headers)
+
+    first = client.get(f"/documents/public/{doc['id']}")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert client.get(f"/documents/public/{doc['id']}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.put(
+        f"/documents/{doc['id']}", json={"title": "Public", "content": "v2", "visibility": "public"}, headers=headers
+    )
+    after = client.get(f"/documents/public/{doc['id']}", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.json()["content"] == "v2"
+
+
+def test_invalidation_during_load_is_not_undone(client, make_user, monkeypatch):
+    _, headers = make_user("ann")
+    doc = create_public(client, headers)
+    validators = http_cache.validators
+
+    # An edit commits (and invalidates) after the route loaded the document but
+    # before it stores it
+    def edit_lands_mid_request(doc_id, *args):
+        http_cache.invalidate_document(doc_id)
+        return validators(doc_id, *args)
+
+    monkeypatch.setattr(http_cache, "validators", edit_lands_mid_request)
+    assert client.get(f"/documents/public/{doc['id']}").status_code == 200
+    assert http_cache.public_cache.get(doc["id"]) is None
+
+    monkeypatch.setattr(http_cache, "validators", validators)
+    assert client.get(f"/documents/public/{doc['id']}").status_code == 200
+    assert http_cache.public_cache.get(doc["id"]) is not None
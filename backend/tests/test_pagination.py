@@ -0,0 +1,98 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import text, update
+
+from app import models
+
+
+def page_through(client, headers, limit):
+    ids, cursor = [], None
+    for _ in range(20):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/documents", params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        ids.extend(item["id"] for item in body["items"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return ids
+    raise AssertionError(f"pagination did not terminate: {ids}")
+
+
+def test_pages_cover_documents_created_in_the_same_second(client, db, make_user):
+    _, headers = make_user("ann")
+    created = [
+        client.post("/documents", json={"title": f"Doc {i}", "content": ""}, headers=headers).json()["id"]
+        for i in range(6)
+    ]
+    # Identical timestamps, stored the way SQLite's CURRENT_TIMESTAMP stores them
+    db.execute(text("UPDATE documents SET created_at = '2024-01-01 12:00:00'"))
+    db.commit()
+
+    assert page_through(client, headers, limit=2) == sorted(created, reverse=True)
+
+
+def test_pages_are_newest_first(client, db, make_user):
+    _, headers = make_user("ann")
+    created = [
+        client.post("/documents", json={"title": f"Doc {i}", "content": ""}, headers=headers).json()["id"]
+        for i in range(5)
+    ]
+    for minute, doc_id in enumerate(created):
+        db.execute(
+            update(models.Document).where(models.Document.id == doc_id)
+            .values(created_at=datetime(2024, 1, 1, 12, minute))
+        )
+    db.commit()
+
+    assert page_through(client, headers, limit=2) == list(reversed(created))
+
+
+def test_invalid_cursor_is_rejected(client, make_user):
+    _, headers = make_user("ann")
+    response = client.get("/documents", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_pages_merge_own_shared_and_public_documents(client, db, make_user):
+    ann_id, ann = make_user("ann")
+    bob_id, bob = make_user("bob")
+    _, carol = make_user("carol")
+
+    def create(headers, title, **fields):
+        body = {"title": title, "content": "<p>" + title + "</p>", **fields}
+        return client.post("/documents", json=body, headers=headers).json()["id"]
+
+    expected = {
+        create(ann, "own private"),
+        create(ann, "own public", visibility="public"),
+        create(bob, "bob public", visibility="public"),
+    }
+    shared = create(bob, "bob shared")
+    shared_public = create(carol, "carol shared public", visibility="public")
+    for doc_id in (shared, shared_public):
+        db.add(models.DocumentShare(document_id=doc_id, user_id=ann_id))
+    db.commit()
+    expected |= {shared, shared_public}
+    create(bob, "bob private")
+    create(carol, "carol private")
+
+    # Documents matching several rules (shared and public) must appear exactly once
+    ids = page_through(client, ann, limit=2)
+    assert sorted(ids) == sorted(expected)
+    assert ids == sorted(ids, reverse=True)
+
+    item = client.get("/documents", params={"limit": 1}, headers=ann).json()["items"][0]
+    assert item["excerpt"] == "<p>carol shared public</p>"
+
+
+def cursor_of(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def test_out_of_range_cursors_are_rejected(client, make_user):
+    _, headers = make_user("ann")
+    for raw in ('["2024-01-01", 1e400]', f'["2024-01-01", {2 ** 70}]', '["2024-01-01", -1]'):
+        response = client.get("/documents", params={"cursor": cursor_of(raw)}, headers=headers)
+        assert response.status_code == 400, raw
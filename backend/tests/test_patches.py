@@ -0,0 +1,78 @@
+import pytest
+from fastapi import HTTPException
+
+from app import models, routes
+from app.database import SessionLocal
+from app.patches import InvalidPatch, apply_ops
+from app.schemas import TextOp
+
+
+def op(pos, delete=0, insert=""):
+    return TextOp(pos=pos, delete=delete, insert=insert)
+
+
+def test_ops_apply_in_order():
+    assert apply_ops("hello world", [op(0, 5, "goodbye"), op(7, 1, ", ")]) == "goodbye, world"
+
+
+def test_positions_are_utf16_code_units():
+    # "😀" is one code point but two UTF-16 units, as in JavaScript
+    assert apply_ops("a😀b", [op(3, 1, "c")]) == "a😀c"
+    assert apply_ops("a😀b", [op(1, 2)]) == "ab"
+
+
+def test_splitting_a_surrogate_pair_is_rejected():
+    with pytest.raises(InvalidPatch):
+        apply_ops("a😀b", [op(2, 1)])
+
+
+def test_out_of_range_ops_are_rejected():
+    with pytest.raises(InvalidPatch):
+        apply_ops("abc", [op(2, 5)])
+    with pytest.raises(InvalidPatch):
+        apply_ops("abc", [op(4, 0, "x")])
+
+
+def test_lone_surrogate_insert_is_a_bad_request(client, make_user):
+    _, headers = make_user("ann")
+    doc = client.post("/documents", json={"title": "Doc", "content": "abc"}, headers=headers).json()
+    # Valid JSON, but "\ud800" alone is not a character
+    body = '{"base_revision": %d, "ops": [{"pos": 1, "insert": "\\ud800"}]}' % doc["revision"]
+    response = client.patch(
+        f"/documents/{doc['id']}", content=body,
+        headers={**headers, "Content-Type": "application/json"}
+    )
+    assert response.status_code == 400
+    assert client.get(f"/documents/{doc['id']}", headers=headers).json()["content"] == "abc"
+
+
+def test_stale_patch_is_a_conflict(client, make_user):
+    _, headers = make_user("ann")
+    doc = client.post("/documents", json={"title": "T", "content": "abc"}, headers=headers).json()
+    url = f"/documents/{doc['id']}"
+
+    saved = client.patch(url, json={"base_revision": doc["revision"], "ops": [{"pos": 3, "insert": "d"}]}, headers=headers)
+    assert saved.status_code == 200
+
+    stale = client.patch(url, json={"base_revision": doc["revision"], "ops": [{"pos": 0, "insert": "x"}]}, headers=headers)
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["revision"] == saved.json()["revision"]
+    assert client.get(url, headers=headers).json()["content"] == "abcd"
+
+
+def test_concurrent_save_is_a_conflict(db, make_user):
+    ann_id, _ = make_user("ann")
+    doc = models.Document(title="T", content="one", author_id=ann_id)
+    db.add(doc)
+    db.commit()
+
+    # Another request saves between this one loading the document and committing
+    other = SessionLocal()
+    other_doc = other.get(models.Document, doc.id)
+    routes.save_edit(other, other_doc, "T", "two", "private")
+    other.close()
+
+    with pytest.raises(HTTPException) as conflict:
+        routes.save_edit(db, doc, "T", "three", "private")
+    assert conflict.value.status_code == 409
+    assert conflict.value.detail["revision"] == 2
@@ -0,0 +1,79 @@
+import random
+import time
+
+from app import revisions
+from app.revisions import MAX_DIFF_CELLS, apply_delta, make_delta
+
+
+def random_text(rng, size, alphabet="abcdefghij "):
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+def test_delta_round_trip():
+    old = "The quick brown fox jumps over the lazy dog"
+    new = "The quick red fox leaps over the lazy dog!"
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_delta_of_identical_text_is_one_copy():
+    assert make_delta("same", "same") == [4]
+
+
+def test_large_rewrite_stays_fast():
+    rng = random.Random(1)
+    body = random_text(rng, 100_000)
+    old, new = "x" + body[1:-1] + "y", "z" + body[1:-1] + "w"
+
+    started = time.perf_counter()
+    ops = make_delta(old, new)
+    assert time.perf_counter() - started < 1
+    assert apply_delta(old, ops) == new
+
+
+def test_diff_size_is_capped(monkeypatch):
+    sizes = []
+
+    class RecordingMatcher(revisions.SequenceMatcher):
+        def __init__(self, isjunk, a, b, autojunk):
+            sizes.append(len(a) * len(b))
+            super().__init__(isjunk, a, b, autojunk=autojunk)
+
+    monkeypatch.setattr(revisions, "SequenceMatcher", RecordingMatcher)
+    rng = random.Random(2)
+    cases = [
+        (random_text(rng, 10_000), random_text(rng, 10_000)),
+        (random_text(rng, 100_000), random_text(rng, 5_000)),
+        (random_text(rng, 5_000, "ab"), random_text(rng, 5_000, "ab")),
+        (random_text(rng, 800), random_text(rng, 900)),
+    ]
+    for old, new in cases:
+        assert apply_delta(old, make_delta(old, new)) == new
+    assert sizes and max(sizes) <= MAX_DIFF_CELLS
+
+
+def test_history_rebuilds_across_snapshot_boundaries(client, make_user):
+    _, headers = make_user("ann")
+    doc = client.post("/documents", json={"title": "Log", "content": "start"}, headers=headers).json()
+
+    contents = {1: "start"}
+    revision = doc["revision"]
+    for n in range(2, 2 * revisions.SNAPSHOT_INTERVAL + 6):
+        response = client.patch(f"/documents/{doc['id']}", json={
+            "base_revision": revision, "ops": [{"pos": len(contents[n - 1]), "insert": f" {n}"}]
+        }, headers=headers)
+        assert response.status_code == 200
+        revision = response.json()["revision"]
+        contents[n] = contents[n - 1] + f" {n}"
+
+    listed = client.get(f"/documents/{doc['id']}/revisions", headers=headers).json()
+    assert [item["number"] for item in listed] == sorted(contents, reverse=True)
+    snapshots = [item["number"] for item in listed if item["kind"] == "snapshot"]
+    assert snapshots == [2 * revisions.SNAPSHOT_INTERVAL + 1, revisions.SNAPSHOT_INTERVAL + 1, 1]
+
+    for number in (1, 2, revisions.SNAPSHOT_INTERVAL, revisions.SNAPSHOT_INTERVAL + 1,
+                   2 * revisions.SNAPSHOT_INTERVAL + 1, revision):
+        got = client.get(f"/documents/{doc['id']}/revisions/{number}", headers=headers)
+        assert got.status_code == 200
+        assert got.json()["content"] == contents[number]
+
+    assert client.get(f"/documents/{doc['id']}/revisions/{revision + 1}", headers=headers).status_code == 404
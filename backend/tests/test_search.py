@@ -0,0 +1,45 @@
+import base64
+
+from app import tasks
+from app.pagination import MAX_OFFSET
+
+
+def create(client, headers, **doc):
+    response = client.post("/documents", json={"visibility": "private", **doc}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def search(client, headers, q):
+    response = client.get("/documents/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["items"]
+
+
+def test_search_finds_prefix_matches(client, make_user):
+    _, headers = make_user("ann")
+    doc = create(client, headers, title="Release roadmap", content="<p>Quarterly deployment notes</p>")
+    tasks.task_queue.wait_idle()
+
+    hits = search(client, headers, "deploy")
+    assert [hit["id"] for hit in hits] == [doc["id"]]
+    assert "<mark>deployment</mark>" in hits[0]["snippet"]
+
+
+def test_snippet_escapes_text_that_looks_like_markup(client, make_user):
+    _, headers = make_user("ann")
+    create(client, headers, title="XSS", content="<p>deploy &lt;img src=x onerror=alert(1)&gt;</p>")
+    tasks.task_queue.wait_idle()
+
+    snippet = search(client, headers, "deploy")[0]["snippet"]
+    assert "<img" not in snippet
+    assert "&lt;img src=x onerror=alert(1)&gt;" in snippet
+    assert "<mark>deploy</mark>" in snippet
+
+
+def test_out_of_range_offset_cursors_are_rejected(client, make_user):
+    _, headers = make_user("ann")
+    for raw in ('{"offset": 1e400}', '{"offset": %d}' % 2 ** 70, '{"offset": %d}' % (MAX_OFFSET + 1)):
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        response = client.get("/documents/search", params={"q": "deploy", "cursor": cursor}, headers=headers)
+        assert response.status_code == 400, raw
@@ -0,0 +1,147 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import models, tasks
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+def job_rows(db):
+    db.expire_all()
+    return db.query(models.BackgroundJob).order_by(models.BackgroundJob.id).all()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """A "record" job kind whose handler logs each batch of payloads."""
+    batches = []
+    monkeypatch.setitem(tasks._handlers, "record", lambda db, payloads: batches.append(list(payloads)))
+    return batches
+
+
+def test_jobs_run_after_commit(db, calls):
+    tasks.enqueue(db, "record", {"n": 1})
+    db.flush()
+    time.sleep(tasks.BATCH_WINDOW_SECONDS * 2)
+    assert calls == []  # written, but not handed over before the commit
+
+    db.commit()
+    assert tasks.task_queue.wait_idle()
+    assert calls == [[{"n": 1}]]
+    assert job_rows(db) == []
+
+
+def test_rolled_back_jobs_never_run(db, calls):
+    tasks.enqueue(db, "record", {"n": 1})
+    db.flush()
+    db.rollback()
+    db.commit()
+
+    assert tasks.task_queue.wait_idle()
+    assert calls == []
+    assert job_rows(db) == []
+
+
+def test_jobs_within_the_window_are_batched(calls):
+    from app.database import SessionLocal
+
+    for n in range(5):
+        session = SessionLocal()
+        tasks.enqueue(session, "record", {"n": n})
+        session.commit()
+        session.close()
+
+    assert tasks.task_queue.wait_idle()
+    assert calls == [[{"n": n} for n in range(5)]]
+
+
+def test_failed_batch_is_retried_job_by_job(db, monkeypatch):
+    monkeypatch.setattr(tasks, "RETRY_BASE_SECONDS", 0.01)
+    batches = []
+
+    def flaky(db, payloads):
+        batches.append([payload["n"] for payload in payloads])
+        if len(batches) == 1:
+            raise RuntimeError("first try fails")
+
+    monkeypatch.setitem(tasks._handlers, "flaky", flaky)
+    tasks.enqueue(db, "flaky", {"n": 1})
+    tasks.enqueue(db, "flaky", {"n": 2})
+    db.commit()
+
+    wait_for(lambda: not job_rows(db))
+    assert batches[0] == [1, 2]
+    assert sorted(batches[1:]) == [[1], [2]]
+
+
+def test_job_is_marked_failed_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(tasks, "RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(tasks, "MAX_ATTEMPTS", 3)
+
+    def broken(db, payloads):
+        raise ValueError("always")
+
+    monkeypatch.setitem(tasks._handlers, "broken", broken)
+    tasks.enqueue(db, "broken", {})
+    db.commit()
+
+    wait_for(lambda: [job.status for job in job_rows(db)] == ["failed"])
+    [job] = job_rows(db)
+    assert job.attempts == 3
+    assert "always" in job.last_error
+    assert tasks.task_queue.pending() == 0
+
+
+def test_retry_waits_for_backoff(db, monkeypatch):
+    monkeypatch.setattr(tasks, "RETRY_BASE_SECONDS", 0.3)
+    attempts = []
+
+    def fails_once(db, payloads):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError("again later")
+
+    monkeypatch.setitem(tasks._handlers, "fails_once", fails_once)
+    tasks.enqueue(db, "fails_once", {})
+    db.commit()
+
+    wait_for(lambda: len(attempts) == 2)
+    assert attempts[1] - attempts[0] >= 0.3
+    wait_for(lambda: not job_rows(db))
+
+
+def test_sweep_picks_up_jobs_left_by_a_stopped_process(db, calls):
+    long_ago = datetime.now(timezone.utc) - timedelta(seconds=tasks.STALE_AFTER_SECONDS * 2)
+    db.add(models.BackgroundJob(kind="record", payload={"n": "orphan"}, run_after=long_ago))
+    # Due just now: probably still owned by a live process, so left alone
+    db.add(models.BackgroundJob(kind="record", payload={"n": "recent"}, run_after=datetime.now(timezone.utc)))
+    db.commit()
+
+    tasks.task_queue.start()
+    wait_for(lambda: calls)
+    assert tasks.task_queue.wait_idle()
+    assert calls == [[{"n": "orphan"}]]
+    assert [job.payload for job in job_rows(db)] == [{"n": "recent"}]
+
+
+def test_mentions_are_shared_in_the_background(client, make_user):
+    bob_id, _ = make_user("bob")
+    _, headers = make_user("ann")
+
+    doc = client.post(
+        "/documents", json={"title": "Hi", "content": "ping @bob and @nobody"}, headers=headers
+    ).json()
+    assert doc["shares"] == []
+
+    assert tasks.task_queue.wait_idle()
+    shares = client.get(f"/documents/{doc['id']}", headers=headers).json()["shares"]
+    assert [share["user_id"] for share in shares] == [bob_id]
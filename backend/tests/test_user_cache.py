@@ -0,0 +1,54 @@
+from app import auth, models
+from app.user_cache import CachedUser, user_cache
+
+
+def test_token_without_subject_is_unauthorized(client):
+    token = auth.create_access_token({"name": "nobody"})
+    response = client.get("/documents", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+
+
+def test_cached_user_is_dropped_when_the_change_commits(client, db, make_user):
+    user_id, headers = make_user("ann")
+    assert client.get("/documents", headers=headers).status_code == 200
+    assert user_cache.get("ann@example.com") is not None
+
+    user = db.get(models.User, user_id)
+    user.username = "anna"
+    db.flush()
+    # Not committed yet: other requests still see (and may cache) the old row
+    assert user_cache.get("ann@example.com") is not None
+    db.commit()
+    assert user_cache.get("ann@example.com") is None
+
+
+def test_rollback_keeps_the_cached_user(client, db, make_user):
+    user_id, headers = make_user("ann")
+    client.get("/documents", headers=headers)
+
+    db.get(models.User, user_id).username = "anna"
+    db.flush()
+    db.rollback()
+    assert user_cache.get("ann@example.com") is not None
+
+
+def test_load_that_raced_a_commit_is_not_cached(db, make_user):
+    user_id, _ = make_user("ann")
+    stale = CachedUser(id=user_id, email="ann@example.com", username="ann")
+
+    # A lookup reads the row, then the update commits before it stores the result
+    generation = user_cache.generation("ann@example.com")
+    db.get(models.User, user_id).username = "anna"
+    db.commit()
+
+    assert not user_cache.set(stale, generation)
+    assert user_cache.get("ann@example.com") is None
+
+
+def test_email_change_invalidates_the_old_address(client, db, make_user):
+    user_id, headers = make_user("ann")
+    client.get("/documents", headers=headers)
+
+    db.get(models.User, user_id).email = "anna@example.com"
+    db.commit()
+    assert client.get("/documents", headers=headers).status_code == 401
@@ -8,6 +8,28 @@ import "react-quill/dist/quill.snow.css";
 const { Title } = Typography;
 const { Option } = Select;
 
+// Smallest single replace turning `before` into `after`, as a server text op.
+// Indexes are JS string (UTF-16) indexes, which is what the API expects.
+function diffOp(before, after) {
+  let start = 0;
+  const max = Math.min(before.length, after.length);
+  while (start < max && before[start] === after[start]) start++;
+  let end = 0;
+  while (
+    end < max - start &&
+    before[before.length - 1 - end] === after[after.length - 1 - end]
+  ) end++;
+  // Don't cut a surrogate pair in half
+  if (start > 0 && /[\uD800-\uDBFF]/.test(before[start - 1])) start--;
+  if (end > 0 && /[\uDC00-\uDFFF]/.test(before[before.length - end])) end--;
+
+  return {
+    pos: start,
+    delete: before.length - end - start,
+    insert: after.slice(start, after.length - end),
+  };
+}
+
 export default function EditDocument() {
   const navigate = useNavigate();
   const { id } = useParams();
@@ -16,25 +38,29 @@ export default function EditDocument() {
   const [title, setTitle] = useState("");
   const [content, setContent] = useState("");
   const [visibility, setVisibility] = useState("private");
+  // Last saved state, used to send only what changed
+  const [baseContent, setBaseContent] = useState("");
+  const [revision, setRevision] = useState(null);
 
   useEffect(() => {
     const fetchDoc = async () => {
       try {
-        const res = await axios.get("/documents", {
+        const res = await axios.get(`/documents/${id}`, {
           headers: { Authorization: `Bearer ${token}` },
         });
-
-        const doc = res.data.find((d) => d.id === parseInt(id));
-        if (!doc) {
-          message.error("Document not found or unauthorized");
-          navigate("/");
-          return;
-        }
+        const doc = res.data;
 
         setTitle(doc.title);
         setContent(doc.content);
+        setBaseContent(doc.content);
+        setRevision(doc.revision);
         setVisibility(doc.visibility || "private"); // fallback
       } catch (err) {
+        if (err.response?.status === 404) {
+          message.error("Document not found or unauthorized");
+          navigate("/");
+          return;
+        }
         console.error("Failed to fetch document:", err);
         message.error("Error loading document");
       }
@@ -49,10 +75,16 @@ export default function EditDocument() {
       return;
     }
 
+    const op = diffOp(baseContent, content);
     try {
-      await axios.put(
+      await axios.patch(
         `/documents/${id}`,
-        { title, content, visibility },
+        {
+          base_revision: revision,
+          ops: op.delete || op.insert ? [op] : [],
+          title,
+          visibility,
+        },
         {
           headers: { Authorization: `Bearer ${token}` },
         }
@@ -61,6 +93,10 @@ export default function EditDocument() {
       message.success("Document updated!");
       navigate("/");
     } catch (err) {
+      if (err.response?.status === 409) {
+        message.error("This document was changed elsewhere. Reload to get the latest version.");
+        return;
+      }
       console.error("Update failed:", err);
       message.error("Failed to update document");
     }
@@ -33,6 +33,7 @@ export default function Home() {
   const [token, setToken] = useState(localStorage.getItem("token"));
   const [documents, setDocuments] = useState([]);
   const [searchQuery, setSearchQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
 
   const [viewModalOpen, setViewModalOpen] = useState(false);
   const [viewDocument, setViewDocument] = useState(null);
@@ -59,7 +60,34 @@ export default function Home() {
     }
   };
 
-  const handleDownload = async (doc) => {
+  // List items only carry an excerpt, so load the full document on demand
+  const fetchFullDocument = async (id) => {
+    const res = await axios.get(`/documents/${id}`, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    return res.data;
+  };
+
+  const handleView = async (id) => {
+    try {
+      setViewDocument(await fetchFullDocument(id));
+      setViewModalOpen(true);
+    } catch (err) {
+      console.error("Failed to load document", err);
+      message.error("Failed to load document");
+    }
+  };
+
+  const handleDownload = async (item) => {
+    let doc;
+    try {
+      doc = await fetchFullDocument(item.id);
+    } catch (err) {
+      console.error("Failed to load document", err);
+      message.error("Failed to load document");
+      return;
+    }
+
     const tempDiv = document.createElement("div");
     tempDiv.style.padding = "20px";
     tempDiv.style.width = "600px";
@@ -85,15 +113,20 @@ export default function Home() {
   };
 
   const fetchDocuments = useCallback(
-    async (q = "") => {
+    async (q = "", cursor = null) => {
       try {
-        const endpoint = q.trim()
-          ? `/documents/search?q=${encodeURIComponent(q)}`
-          : "/documents";
-        const res = await axios.get(endpoint, {
-          headers: { Authorization: `Bearer ${token}` },
-        });
-        setDocuments(res.data);
+        const params = cursor ? { cursor } : {};
+        const res = q.trim()
+          ? await axios.get("/documents/search", {
+              headers: { Authorization: `Bearer ${token}` },
+              params: { ...params, q },
+            })
+          : await axios.get("/documents", {
+              headers: { Authorization: `Bearer ${token}` },
+              params,
+            });
+        setDocuments((prev) => (cursor ? [...prev, ...res.data.items] : res.data.items));
+        setNextCursor(res.data.next_cursor);
       } catch (err) {
         console.error("Failed to fetch documents", err);
         message.error("Failed to load documents");
@@ -158,10 +191,7 @@ export default function Home() {
                 <Card
                   title={doc.title || "Untitled"}
                   actions={[
-                    <EyeOutlined key="view" onClick={() => {
-                      setViewDocument(doc);
-                      setViewModalOpen(true);
-                    }} />,
+                    <EyeOutlined key="view" onClick={() => handleView(doc.id)} />,
                     <EditOutlined key="edit" onClick={() => navigate(`/edit/${doc.id}`)} />,
                     <DeleteOutlined key="delete" onClick={() => handleDelete(doc.id)} />,
                     <DownloadOutlined key="download" onClick={() => handleDownload(doc)} />,
@@ -171,7 +201,7 @@ export default function Home() {
                   <div
                     className="text-gray-600 text-sm"
                     dangerouslySetInnerHTML={{
-                      __html: doc.content?.substring(0, 150) || "<i>No preview</i>",
+                      __html: doc.snippet || (doc.excerpt ?? doc.content)?.substring(0, 150) || "<i>No preview</i>",
                     }}
                   />
                   <Text type="secondary" className="text-xs block mt-2">
@@ -185,6 +215,12 @@ export default function Home() {
           <Empty description="No documents found" className="mt-20" />
         )}
 
+        {nextCursor && (
+          <div className="flex justify-center mt-6">
+            <Button onClick={() => fetchDocuments(searchQuery, nextCursor)}>Load more</Button>
+          </div>
+        )}
+
         {/* 📄 Document View Modal */}
         <Modal
           title={viewDocument?.title || "Untitled"}